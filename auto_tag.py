@@ -5,72 +5,219 @@
 利用MaterialSearch的向量数据库和CLIP模型，为图片和视频自动添加标签
 """
 
+import hashlib
 import json
 import logging
 import os
-import pickle
 import re
 import shutil
-from collections import defaultdict
-from pathlib import Path
-from typing import List, Tuple, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Set, Tuple
 
 import numpy as np
+from sqlalchemy.orm import Session
 from tqdm import tqdm
 
 from config import *
-from database import get_image_id_path_features, get_video_paths, get_frame_times_features_by_path
+from database import (
+    get_frame_times_features_by_path,
+    get_image_count,
+    get_image_id_path_features_in_batches,
+    get_video_paths,
+)
 from models import DatabaseSession, Image, Video
-from process_assets import process_text
+from process_assets import process_text, process_texts
 from tag_vocabulary import ENGLISH_TAGS, ENGLISH_TO_CHINESE
 
+try:  # 可选依赖：安装 simsimd 后使用其 SIMD 内核计算余弦相似度，否则使用 NumPy
+    import simsimd
+except ImportError:
+    simsimd = None
+
+try:  # 可选依赖：numba，similarity_backend='numba' 时使用
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+try:  # torch 随 CLIP 模型一起安装，similarity_backend='torch' 时在推理设备（如GPU）上计算
+    import torch
+except ImportError:
+    torch = None
+
+try:  # 可选依赖：faiss，similarity_backend='faiss' 时使用 IndexFlatIP 计算
+    import faiss
+except ImportError:
+    faiss = None
+
+SIMILARITY_BACKENDS = ('auto', 'simsimd', 'numpy', 'numba', 'torch', 'faiss')  # auto: 安装了 simsimd 则用 simsimd，否则用 numpy
+
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+TAG_BATCH_SIZE = 128  # 计算标签向量时每次送入模型的标签数量
+DB_COMMIT_INTERVAL = 256  # 批量更新数据库时，每多少条记录提交一次
+IMAGE_BATCH_SIZE = 4096  # 处理图片时每次从数据库读取并计算相似度的图片数量
+RENAME_WORKERS = 8  # 并发重命名文件的线程数
+
+# 生成文件名时用于清理标签字符串的正则
+_SAFE_CHARS_RE = re.compile(r'[^\w\s-]')  # 特殊字符
+_COLLAPSE_RE = re.compile(r'[-\s]+')  # 连续的空白和连字符
+
+
+def _features_to_matrix(features) -> np.ndarray:
+    """把数据库中逐条保存的特征二进制数据拼接一次，转换为 shape=(条数, 维度) 的float32矩阵"""
+    return np.frombuffer(b"".join(features), dtype=np.float32).reshape(len(features), -1)
+
+
+def _quantize_int8(vectors: np.ndarray) -> np.ndarray:
+    """
+    把向量按行量化为int8
+    每行按自身的最大绝对值缩放到[-127, 127]，用满int8的精度（归一化的512维向量分量通常远小于1）；
+    余弦相似度与每行的缩放系数无关，因此不需要保存缩放系数，也不需要先归一化
+    """
+    scale = 127 / (np.abs(vectors).max(axis=1, keepdims=True) + 1e-12)
+    return np.rint(vectors * scale).astype(np.int8)
+
+
+if njit is not None:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _cosine_similarity_numba(features, tag_matrix):
+        """
+        numba 版本的余弦相似度计算，用于不方便使用 BLAS / simsimd 的环境
+        :param features: float32 特征矩阵，shape=(n, 维度)
+        :param tag_matrix: 已归一化的 float32 标签向量矩阵，shape=(m, 维度)
+        :return: 余弦相似度矩阵，shape=(n, m)
+        """
+        n, dim = features.shape
+        m = tag_matrix.shape[0]
+        inv_norms = np.empty(n, dtype=np.float32)
+        for i in prange(n):
+            norm_sq = 0.0
+            for d in range(dim):
+                norm_sq += features[i, d] * features[i, d]
+            inv_norms[i] = 1.0 / (np.sqrt(norm_sq) + 1e-8)
+        out = np.empty((n, m), dtype=np.float32)
+        # 按 (特征, 标签) 对并行，单个特征时也能用满所有线程
+        for idx in prange(n * m):
+            i = idx // m
+            j = idx % m
+            dot = 0.0
+            for d in range(dim):
+                dot += features[i, d] * tag_matrix[j, d]
+            out[i, j] = dot * inv_norms[i]
+        return out
+
 
 class AutoTagger:
     """自动标签器类"""
     
-    def __init__(self, tag_cache_file: str = "tag_vectors.pkl", 
+    def __init__(self, tag_cache_file: str = "tag_vectors.npy", 
                  similarity_threshold: float = 0.3,
                  top_k: int = 5,
-                 video_min_frequency: int = 2):
+                 video_min_frequency: int = 2,
+                 use_int8: bool = False,
+                 similarity_backend: str = 'auto'):
         """
         初始化自动标签器
         
         Args:
-            tag_cache_file: 标签向量缓存文件路径
+            tag_cache_file: 标签向量缓存文件路径，标签名和缓存标识保存在同名的 .json 文件中
             similarity_threshold: 相似度阈值
             top_k: 返回前k个标签
             video_min_frequency: 视频标签最小出现频率
+            use_int8: 是否使用int8量化的向量计算相似度（需要安装 simsimd），内存带宽为float32的1/4，排序结果基本不变
+            similarity_backend: 相似度计算方式，可选值见 SIMILARITY_BACKENDS
         """
         self.tag_cache_file = tag_cache_file
+        self.tag_names_file = os.path.splitext(tag_cache_file)[0] + '.json'
         self.similarity_threshold = similarity_threshold
         self.top_k = top_k
         self.video_min_frequency = video_min_frequency
-        self.tag_vectors: Optional[np.ndarray] = None
+        self.use_int8 = use_int8 and simsimd is not None
+        if use_int8 and simsimd is None:
+            logger.warning("未安装 simsimd，int8 相似度计算不可用，使用 float32 计算")
+        self.similarity_backend = self._resolve_backend(similarity_backend)
+        self.tag_names: List[str] = []  # 与 tag_matrix 的行一一对应
+        self.chinese_names: List[str] = []  # tag_names 对应的中文标签，按下标直接查找
+        self.tag_matrix: Optional[np.ndarray] = None  # 已归一化的标签向量矩阵，shape=(标签数, 维度)
+        self.tag_matrix_i8: Optional[np.ndarray] = None  # tag_matrix 的int8量化版本，use_int8 时使用
+        self.tag_matrix_t = None  # tag_matrix 在推理设备上的副本，similarity_backend='torch' 时使用
+        self.tag_index = None  # tag_matrix 的 faiss 内积索引，similarity_backend='faiss' 时使用
+        self._dir_cache: Dict[str, Set[str]] = {}  # 目录 -> 目录下的文件名集合，重命名时用于检查文件名冲突
         self._load_or_compute_tag_vectors()
     
+    @staticmethod
+    def _resolve_backend(backend: str) -> str:
+        """
+        确定实际使用的相似度计算方式，依赖未安装时退回 numpy
+        
+        Args:
+            backend: 指定的计算方式
+            
+        Returns:
+            实际使用的计算方式：simsimd / numpy / numba / torch / faiss
+        """
+        if backend not in SIMILARITY_BACKENDS:
+            raise ValueError(f"未知的相似度计算方式: {backend}，可选值: {SIMILARITY_BACKENDS}")
+        if backend == 'auto':
+            return 'simsimd' if simsimd is not None else 'numpy'
+        if backend == 'simsimd' and simsimd is None:
+            logger.warning("未安装 simsimd，使用 numpy 计算相似度")
+            return 'numpy'
+        if backend == 'numba' and njit is None:
+            logger.warning("未安装 numba，使用 numpy 计算相似度")
+            return 'numpy'
+        if backend == 'torch' and torch is None:
+            logger.warning("未安装 torch，使用 numpy 计算相似度")
+            return 'numpy'
+        if backend == 'faiss' and faiss is None:
+            logger.warning("未安装 faiss，使用 numpy 计算相似度")
+            return 'numpy'
+        return backend
+    
+    def _set_tag_matrix(self, tag_names: List[str], vectors: np.ndarray) -> None:
+        """
+        设置标签向量矩阵
+        
+        Args:
+            tag_names: 标签名列表，顺序与 vectors 的行一致
+            vectors: 已L2归一化的标签向量，shape=(标签数, 维度)
+        """
+        self.tag_names = list(tag_names)
+        self.chinese_names = [ENGLISH_TO_CHINESE.get(tag, tag) for tag in self.tag_names]
+        self.tag_matrix = np.ascontiguousarray(vectors, dtype=np.float32)
+        # int8 版本由 float32 矩阵直接量化得到，开销很小，不单独缓存
+        self.tag_matrix_i8 = _quantize_int8(self.tag_matrix) if self.use_int8 else None
+        if self.similarity_backend == 'torch':
+            # 标签矩阵只上传一次；CUDA 上使用 float16，显存带宽减半并可使用 Tensor Core
+            dtype = torch.float16 if str(DEVICE).startswith('cuda') else torch.float32
+            self.tag_matrix_t = torch.tensor(self.tag_matrix, device=DEVICE, dtype=dtype)
+        if self.similarity_backend == 'faiss':
+            # 标签向量已归一化，内积即余弦相似度；词表扩大后可以换成 IVF 等近似索引
+            self.tag_index = faiss.IndexFlatIP(self.tag_matrix.shape[1])
+            self.tag_index.add(self.tag_matrix)
+    
     def _load_or_compute_tag_vectors(self) -> None:
         """加载或计算标签向量"""
-        if os.path.exists(self.tag_cache_file):
+        if os.path.exists(self.tag_cache_file) and os.path.exists(self.tag_names_file):
             logger.info(f"从缓存文件加载标签向量: {self.tag_cache_file}")
             try:
-                with open(self.tag_cache_file, 'rb') as f:
-                    loaded_data = pickle.load(f)
-                
-                # 处理不同格式的缓存数据
-                if isinstance(loaded_data, dict):
-                    # 旧格式：字典格式
-                    self.tag_vectors = np.stack([v for v in loaded_data.values()])
-                elif isinstance(loaded_data, np.ndarray):
-                    # 新格式：numpy数组
-                    self.tag_vectors = loaded_data
-                else:
-                    raise ValueError(f"未知的缓存格式: {type(loaded_data)}")
+                # 缓存格式：.npy 为已归一化的标签向量矩阵（float16 存储），.json 为缓存标识和按行对应的英文标签
+                # 以内存映射方式打开，转成 float32 时直接从页缓存读取，不需要先把整个文件读入内存
+                with open(self.tag_names_file, 'r', encoding='utf-8') as f:
+                    cache_info = json.load(f)
+                # 标签词表或CLIP模型变化后缓存自动失效，不需要手动删除缓存文件
+                if not isinstance(cache_info, dict) or cache_info.get('key') != self._tag_cache_key():
+                    raise ValueError("标签词表或模型已变化，重新计算")
+                tag_names = cache_info['names']
+                matrix = np.load(self.tag_cache_file, mmap_mode='r')
+                if matrix.ndim != 2 or matrix.shape[0] != len(tag_names):
+                    raise ValueError(f"标签数量与向量矩阵不一致: {len(tag_names)} != {matrix.shape[0]}")
+                # float16 存储后向量的模长会偏离1，加载时转回 float32 重新归一化一次，运行时余弦相似度仍然只是点积
+                self._set_tag_matrix(tag_names, self._normalize_rows(np.asarray(matrix, dtype=np.float32)))
                 
-                logger.info(f"成功加载 {self.tag_vectors.shape[0]} 个标签向量")
+                logger.info(f"成功加载 {self.tag_matrix.shape[0]} 个标签向量")
                 return
                 
             except Exception as e:
@@ -80,6 +227,11 @@ class AutoTagger:
         self._compute_tag_vectors()
         self._save_tag_vectors()
     
+    @staticmethod
+    def _tag_cache_key() -> str:
+        """根据模型名和英文标签列表生成缓存标识，两者任一变化时缓存失效"""
+        return hashlib.sha1((MODEL_NAME + repr(ENGLISH_TAGS)).encode('utf-8')).hexdigest()
+    
     def _compute_tag_vectors(self) -> None:
         """计算所有标签的向量"""
         logger.info(f"正在为 {len(ENGLISH_TAGS)} 个标签计算向量...")
@@ -87,31 +239,43 @@ class AutoTagger:
         vectors = []
         valid_tags = []
         
-        for tag in tqdm(ENGLISH_TAGS, desc="计算标签向量"):
-            text_feature = process_text(tag)
-            if text_feature is None:
-                logger.warning(f"无法计算标签向量: {tag}")
-                continue
-            
-            vectors.append(text_feature.flatten())
-            valid_tags.append(tag)
+        for start in tqdm(range(0, len(ENGLISH_TAGS), TAG_BATCH_SIZE), desc="计算标签向量"):
+            batch_tags = ENGLISH_TAGS[start:start + TAG_BATCH_SIZE]
+            batch_features = process_texts(batch_tags)
+            if batch_features is None:
+                # 批量计算失败时逐个计算，尽量保留能计算的标签
+                logger.warning(f"批量计算标签向量失败，改为逐个计算: {batch_tags[0]} 等 {len(batch_tags)} 个标签")
+                batch_features = [process_text(tag) for tag in batch_tags]
+            
+            for tag, text_feature in zip(batch_tags, batch_features):
+                if text_feature is None:
+                    logger.warning(f"无法计算标签向量: {tag}")
+                    continue
+                
+                vectors.append(text_feature.reshape(-1))
+                valid_tags.append(tag)
         
         if not vectors:
             raise RuntimeError("没有成功计算任何标签向量")
         
-        self.tag_vectors = np.stack(vectors)
-        logger.info(f"完成标签向量计算，共 {self.tag_vectors.shape[0]} 个标签")
+        # 建立缓存时就做L2归一化，运行时余弦相似度即为点积；所有向量拼成矩阵后一次完成
+        matrix = np.stack(vectors).astype(np.float32, copy=False)
+        self._set_tag_matrix(valid_tags, self._normalize_rows(matrix))
+        logger.info(f"完成标签向量计算，共 {self.tag_matrix.shape[0]} 个标签")
     
     def _save_tag_vectors(self) -> None:
         """保存标签向量到缓存文件"""
         try:
+            # 归一化后的向量用 float16 保存已足够排序精度，缓存文件大小和加载时间减半
             with open(self.tag_cache_file, 'wb') as f:
-                pickle.dump(self.tag_vectors, f)
+                np.save(f, self.tag_matrix.astype(np.float16))
+            with open(self.tag_names_file, 'w', encoding='utf-8') as f:
+                json.dump({'key': self._tag_cache_key(), 'names': self.tag_names}, f, ensure_ascii=False)
             logger.info(f"标签向量已保存到: {self.tag_cache_file}")
         except Exception as e:
             logger.error(f"保存标签向量失败: {e}")
     
-    def compute_similarity(self, image_feature: np.ndarray) -> Dict[str, float]:
+    def compute_similarity(self, image_feature: np.ndarray) -> np.ndarray:
         """
         计算图片特征与标签向量的相似度
         
@@ -119,43 +283,124 @@ class AutoTagger:
             image_feature: 图片特征向量
             
         Returns:
-            相似度分数字典
+            余弦相似度数组，shape=(标签数,)，顺序与 tag_names 一致
+        """
+        return self.compute_similarity_batch(image_feature.reshape(1, -1))[0]
+    
+    def compute_similarity_batch(self, features: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        批量计算多个特征与标签向量的相似度，所有特征只做一次矩阵乘法
+        
+        Args:
+            features: 特征矩阵，shape=(特征数, 维度)
+            out: 可选的 float32 输出矩阵，shape=(特征数, 标签数)，numpy 计算时结果直接写入其中，
+                 分批处理时可以重复使用同一块内存；调用方需要在下一次写入前用完其中的结果
+            
+        Returns:
+            余弦相似度矩阵，shape=(特征数, 标签数)，列顺序与 tag_names 一致
         """
-        if self.tag_vectors is None:
+        if self.tag_matrix is None:
             raise RuntimeError("标签向量未初始化")
         
-        image_feature = image_feature.flatten()
+        features = np.ascontiguousarray(features, dtype=np.float32)
+        
+        if self.use_int8:
+            distances = simsimd.cdist(_quantize_int8(features), self.tag_matrix_i8, metric='cosine')
+            return 1.0 - np.asarray(distances, dtype=np.float32)
         
-        # 计算余弦相似度
-        # 添加小量避免除零
-        norm_product = (np.linalg.norm(self.tag_vectors, axis=1) * 
-                       np.linalg.norm(image_feature) + 1e-8)
-        similarities = np.dot(self.tag_vectors, image_feature) / norm_product
+        if self.similarity_backend == 'simsimd':
+            # simsimd 返回余弦距离，1 - 距离即为余弦相似度
+            distances = simsimd.cdist(features, self.tag_matrix, metric='cosine')
+            return 1.0 - np.asarray(distances, dtype=np.float32)
         
-        return {ENGLISH_TAGS[i]: float(sim) for i, sim in enumerate(similarities)}
+        if self.similarity_backend == 'numba':
+            return _cosine_similarity_numba(features, self.tag_matrix)
+        
+        if self.similarity_backend == 'torch':
+            with torch.inference_mode():
+                queries = torch.tensor(features, device=DEVICE, dtype=self.tag_matrix_t.dtype)
+                queries = torch.nn.functional.normalize(queries, dim=1)
+                return (queries @ self.tag_matrix_t.T).float().cpu().numpy()
+        
+        if self.similarity_backend == 'faiss':
+            # search 返回每行按相似度排好序的结果，按标签下标放回原位，列顺序与 tag_names 保持一致
+            scores, indices = self.tag_index.search(self._normalize_rows(features), self.tag_index.ntotal)
+            similarities = np.empty_like(scores)
+            np.put_along_axis(similarities, indices, scores, axis=1)
+            return similarities
+        
+        # 标签向量已归一化，只需归一化特征，余弦相似度即为一次矩阵乘法
+        return np.matmul(self._normalize_rows(features), self.tag_matrix.T, out=out)
     
-    def get_top_tags(self, similarities: Dict[str, float]) -> List[Tuple[str, float]]:
+    @staticmethod
+    def _normalize_rows(features: np.ndarray) -> np.ndarray:
+        """对特征矩阵每一行做L2归一化，添加小量避免除零"""
+        # 用 einsum + sqrt 代替 np.linalg.norm，省去其类型和axis分派的开销
+        norms = np.sqrt(np.einsum('ij,ij->i', features, features))
+        return features / (norms[:, None] + 1e-8)
+    
+    def get_top_tags(self, similarities: np.ndarray, top_k: Optional[int] = None,
+                     threshold: Optional[float] = None) -> List[Tuple[str, float]]:
         """
         获取相似度最高的标签
         
         Args:
-            similarities: 相似度字典
+            similarities: 相似度数组，顺序与 tag_names 一致
+            top_k: 返回前k个标签，默认使用 self.top_k
+            threshold: 相似度阈值，默认使用 self.similarity_threshold
             
         Returns:
             标签和分数的元组列表
         """
-        # 过滤低于阈值的标签
-        filtered_similarities = {
-            tag: score for tag, score in similarities.items() 
-            if score >= self.similarity_threshold
-        }
+        top_indices = self._get_top_tag_indices(similarities, top_k, threshold)
+        return [(self.tag_names[i], float(similarities[i])) for i in top_indices]
+    
+    def _get_top_tag_indices(self, similarities: np.ndarray, top_k: Optional[int] = None,
+                             threshold: Optional[float] = None) -> List[int]:
+        """
+        获取相似度最高的标签的下标
         
-        # 按相似度排序
-        sorted_tags = sorted(filtered_similarities.items(), 
-                           key=lambda x: x[1], reverse=True)
+        Args:
+            similarities: 相似度数组，顺序与 tag_names 一致
+            top_k: 返回前k个标签，默认使用 self.top_k
+            threshold: 相似度阈值，默认使用 self.similarity_threshold
+            
+        Returns:
+            标签下标列表，按相似度从高到低排列
+        """
+        top_indices, above_threshold = self._get_top_tag_indices_batch(similarities[None, :], top_k, threshold)
+        return top_indices[0][above_threshold[0]].tolist()
+    
+    def _get_top_tag_indices_batch(self, similarities: np.ndarray, top_k: Optional[int] = None,
+                                   threshold: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        批量获取每一行相似度最高的标签的下标，所有行一起选取，不逐行调用
         
-        # 返回前k个标签
-        return sorted_tags[:self.top_k]
+        Args:
+            similarities: 相似度矩阵，shape=(行数, 标签数)，列顺序与 tag_names 一致
+            top_k: 每行取前k个标签，默认使用 self.top_k
+            threshold: 相似度阈值，默认使用 self.similarity_threshold
+            
+        Returns:
+            (标签下标矩阵, 是否达到阈值的掩码)，shape 均为 (行数, k)，每行按相似度从高到低排列
+        """
+        top_k = self.top_k if top_k is None else top_k
+        threshold = self.similarity_threshold if threshold is None else threshold
+        
+        k = max(min(top_k, similarities.shape[1]), 0)
+        if k == 0:
+            empty = np.empty((similarities.shape[0], 0), dtype=np.intp)
+            return empty, empty.astype(bool)
+        
+        # argpartition 以O(n)选出每行前k个，只对这k个排序
+        top_indices = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(similarities, top_indices, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind='stable')
+        top_indices = np.take_along_axis(top_indices, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+        
+        # 过滤低于阈值的标签
+        return top_indices, top_scores >= threshold
     
     def process_image(self, image_id: int, image_path: str, 
                      image_feature: np.ndarray) -> List[str]:
@@ -173,27 +418,37 @@ class AutoTagger:
         try:
             # 计算相似度
             similarities = self.compute_similarity(image_feature)
-            
-            # 获取top标签
-            top_tags = self.get_top_tags(similarities)
-            
-            if not top_tags:
-                logger.warning(f"图片 {image_path} 没有找到匹配的标签")
-                return []
-            
-            # 转换为中文标签
-            chinese_tags = []
-            for tag, score in top_tags:
-                chinese_tag = ENGLISH_TO_CHINESE.get(tag, tag)
-                chinese_tags.append(chinese_tag)
-                logger.debug(f"图片 {image_path}: {chinese_tag} (相似度: {score:.3f})")
-            
-            return chinese_tags
+            return self._get_image_tags(image_path, similarities, self._get_top_tag_indices(similarities))
             
         except Exception as e:
             logger.error(f"处理图片 {image_path} 时出错: {e}")
             return []
     
+    def _get_image_tags(self, image_path: str, similarities: np.ndarray, top_indices: List[int]) -> List[str]:
+        """
+        把相似度最高的标签下标转换为图片的中文标签
+        
+        Args:
+            image_path: 图片路径
+            similarities: 图片与所有标签的相似度数组
+            top_indices: 达到阈值的标签下标，按相似度从高到低排列
+            
+        Returns:
+            中文标签列表
+        """
+        if not top_indices:
+            logger.warning(f"图片 {image_path} 没有找到匹配的标签")
+            return []
+        
+        # 转换为中文标签
+        chinese_tags = []
+        for i in top_indices:
+            chinese_tag = self.chinese_names[i]
+            chinese_tags.append(chinese_tag)
+            logger.debug(f"图片 {image_path}: {chinese_tag} (相似度: {similarities[i]:.3f})")
+        
+        return chinese_tags
+    
     def process_video(self, video_path: str) -> List[str]:
         """
         处理视频，分析所有帧并合并标签
@@ -205,87 +460,90 @@ class AutoTagger:
             视频标签列表
         """
         logger.info(f"处理视频: {video_path}")
+        with DatabaseSession() as session:
+            features = self._read_video_features(session, video_path)
+        return self._tag_video_features(video_path, features)
+    
+    @staticmethod
+    def _read_video_features(session: Session, video_path: str) -> Optional[Tuple[bytes, ...]]:
+        """
+        从数据库读取视频所有帧的特征
         
-        try:
-            with DatabaseSession() as session:
-                frame_times, features = get_frame_times_features_by_path(session, video_path)
-            
-            if not features:
-                logger.warning(f"视频 {video_path} 没有找到帧特征")
-                return []
-            
-            # 处理所有帧
-            all_tags = []
-            for i, feature in enumerate(features):
-                try:
-                    feature_array = np.frombuffer(feature, dtype=np.float32).reshape(1, -1)
-                    similarities = self.compute_similarity(feature_array)
-                    top_tags = self.get_top_tags(similarities)
-                    
-                    for tag, score in top_tags:
-                        chinese_tag = ENGLISH_TO_CHINESE.get(tag, tag)
-                        all_tags.append(chinese_tag)
-                        
-                except Exception as e:
-                    logger.warning(f"处理视频帧 {i} 时出错: {e}")
-                    continue
-            
-            if not all_tags:
-                logger.warning(f"视频 {video_path} 没有找到任何标签")
-                return []
+        Args:
+            session: 数据库会话
+            video_path: 视频路径
             
-            # 统计标签频率
-            tag_counts = defaultdict(int)
-            for tag in all_tags:
-                tag_counts[tag] += 1
+        Returns:
+            按帧时间排列的特征二进制数据，读取出错时返回 None
+        """
+        try:
+            frame_times, features = get_frame_times_features_by_path(session, video_path)
+            return features
+        except Exception as e:
+            logger.error(f"读取视频 {video_path} 的帧特征时出错: {e}")
+            return None
+    
+    def _tag_video_features(self, video_path: str, features: Optional[Tuple[bytes, ...]]) -> List[str]:
+        """
+        根据已读出的帧特征计算视频标签
+        
+        Args:
+            video_path: 视频路径
+            features: 按帧时间排列的特征二进制数据
             
-            # 按频率排序，取前10个，至少出现指定次数
-            sorted_tags = sorted(tag_counts.items(), key=lambda x: x[1], reverse=True)
-            video_tags = [
-                tag for tag, count in sorted_tags[:10] 
-                if count >= self.video_min_frequency
-            ]
+        Returns:
+            视频标签列表
+        """
+        if not features:
+            logger.warning(f"视频 {video_path} 没有找到帧特征")
+            return []
+        
+        try:
+            # 所有帧特征拼成一个矩阵，只做一次矩阵乘法计算相似度
+            feature_matrix = _features_to_matrix(features)
+            similarities = self.compute_similarity_batch(feature_matrix)
             
-            logger.info(f"视频 {video_path} 标签: {video_tags}")
-            return video_tags
+            return self._get_video_tags(video_path, similarities)
             
         except Exception as e:
             logger.error(f"处理视频 {video_path} 时出错: {e}")
             return []
     
-    def update_database_tags(self, file_type: str, file_id: int, 
-                           file_path: str, tags: List[str]) -> bool:
+    def _get_video_tags(self, video_path: str, similarities: np.ndarray) -> List[str]:
         """
-        更新数据库中的标签
+        根据所有帧的相似度统计视频标签
         
         Args:
-            file_type: 文件类型 ('image' 或 'video')
-            file_id: 文件ID
-            file_path: 文件路径
-            tags: 标签列表
+            video_path: 视频路径
+            similarities: 每一帧与所有标签的相似度矩阵，shape=(帧数, 标签数)
             
         Returns:
-            是否更新成功
+            视频标签列表
         """
-        try:
-            with DatabaseSession() as session:
-                if file_type == 'image':
-                    record = session.query(Image).filter_by(id=file_id).first()
-                else:
-                    record = session.query(Video).filter_by(id=file_id).first()
-                
-                if record is not None:
-                    record.tags = json.dumps(tags, ensure_ascii=False)
-                    session.commit()
-                    logger.info(f"已更新 {file_type} {file_path} 的标签: {tags}")
-                    return True
-                else:
-                    logger.warning(f"未找到 {file_type} 记录: {file_path}")
-                    return False
-                    
-        except Exception as e:
-            logger.error(f"更新数据库标签失败: {e}")
-            return False
+        # 每一帧取相似度最高的前k个标签，帧内按相似度从高到低排列
+        top_indices, above_threshold = self._get_top_tag_indices_batch(similarities)
+        
+        # 过滤低于阈值的标签，按行展开后即为逐帧的标签序列
+        frame_tags = top_indices[above_threshold]
+        
+        if frame_tags.size == 0:
+            logger.warning(f"视频 {video_path} 没有找到任何标签")
+            return []
+        
+        # 统计标签频率
+        tag_counts = np.bincount(frame_tags, minlength=len(self.tag_names))
+        
+        # 按频率排序，频率相同时按首次出现的顺序，取前10个，至少出现指定次数
+        unique_tags, first_seen = np.unique(frame_tags, return_index=True)
+        sorted_tags = unique_tags[np.lexsort((first_seen, -tag_counts[unique_tags]))][:10]
+        video_tags = [
+            self.chinese_names[i]
+            for i in sorted_tags
+            if tag_counts[i] >= self.video_min_frequency
+        ]
+        
+        logger.info(f"视频 {video_path} 标签: {video_tags}")
+        return video_tags
     
     def generate_filename(self, original_path: str, tags: List[str]) -> str:
         """
@@ -301,30 +559,49 @@ class AutoTagger:
         if not tags:
             return original_path
         
-        # 获取文件信息
-        path_obj = Path(original_path)
-        extension = path_obj.suffix
-        parent_dir = path_obj.parent
+        # 获取文件信息，只拆分一次路径，新文件名与原文件在同一目录
+        parent_dir, basename = os.path.split(original_path)
+        extension = os.path.splitext(basename)[1]
         
         # 取前3个标签作为文件名
         tag_part = "_".join(tags[:3])
         
         # 清理标签字符串，移除特殊字符
-        tag_part = re.sub(r'[^\w\s-]', '', tag_part)
-        tag_part = re.sub(r'[-\s]+', '_', tag_part)
+        tag_part = _SAFE_CHARS_RE.sub('', tag_part)
+        tag_part = _COLLAPSE_RE.sub('_', tag_part)
         
         # 生成新文件名
         new_filename = f"{tag_part}{extension}"
-        new_path = parent_dir / new_filename
         
-        # 如果文件已存在，添加数字后缀
+        # 如果文件已存在，添加数字后缀。每个目录只列出一次文件，之后在内存中检查冲突
+        existing = self._get_dir_entries(parent_dir)
         counter = 1
-        while new_path.exists():
+        while os.path.normcase(new_filename) in existing:
             new_filename = f"{tag_part}_{counter}{extension}"
-            new_path = parent_dir / new_filename
             counter += 1
+        # 预先占用这个文件名，同一批中的其他文件不会再分到它，重命名可以并发执行
+        existing.add(os.path.normcase(new_filename))
         
-        return str(new_path)
+        return os.path.join(parent_dir, new_filename)
+    
+    def _get_dir_entries(self, directory: str) -> Set[str]:
+        """
+        获取目录下的文件名集合，结果会被缓存，重命名时同步更新
+        
+        Args:
+            directory: 目录路径，空字符串表示当前目录
+            
+        Returns:
+            文件名集合（经过 os.path.normcase 处理，以兼容不区分大小写的文件系统）
+        """
+        entries = self._dir_cache.get(directory)
+        if entries is None:
+            try:
+                entries = {os.path.normcase(name) for name in os.listdir(directory or os.curdir)}
+            except OSError:
+                entries = set()
+            self._dir_cache[directory] = entries
+        return entries
     
     def rename_file(self, old_path: str, new_path: str) -> bool:
         """
@@ -338,39 +615,25 @@ class AutoTagger:
             是否成功
         """
         try:
-            shutil.move(old_path, new_path)
+            # 文件名冲突检查使用的是缓存的目录列表，移动前再确认一次，避免覆盖期间新出现的文件
+            if os.path.exists(new_path):
+                raise FileExistsError(f"目标文件已存在: {new_path}")
+            try:
+                # 新文件名与原文件在同一目录，直接重命名只需一次系统调用
+                os.replace(old_path, new_path)
+            except OSError:
+                # 跨文件系统等情况无法直接重命名，退回 shutil.move 复制后删除
+                shutil.move(old_path, new_path)
+            # 新文件名在 generate_filename 中已加入缓存，这里只需移除旧文件名
+            old_entries = self._dir_cache.get(os.path.dirname(old_path))
+            if old_entries is not None:
+                old_entries.discard(os.path.normcase(os.path.basename(old_path)))
             logger.info(f"文件重命名: {old_path} -> {new_path}")
             return True
         except Exception as e:
             logger.error(f"文件重命名失败: {old_path} -> {new_path}, 错误: {e}")
             return False
     
-    def _has_existing_tags(self, file_type: str, file_id: Optional[int] = None, 
-                          file_path: Optional[str] = None) -> bool:
-        """
-        检查文件是否已有标签
-        
-        Args:
-            file_type: 文件类型
-            file_id: 文件ID（图片用）
-            file_path: 文件路径（视频用）
-            
-        Returns:
-            是否已有标签
-        """
-        try:
-            with DatabaseSession() as session:
-                if file_type == 'image':
-                    record = session.query(Image).filter_by(id=file_id).first()
-                else:
-                    record = session.query(Video).filter_by(path=file_path).first()
-                
-                return record is not None and record.tags is not None
-                
-        except Exception as e:
-            logger.error(f"检查标签状态失败: {e}")
-            return False
-    
     def process_all_images(self, enable_rename: bool = False) -> None:
         """
         处理所有图片
@@ -382,51 +645,104 @@ class AutoTagger:
         
         try:
             with DatabaseSession() as session:
-                ids, paths, features = get_image_id_path_features(session)
-            
-            if not ids:
-                logger.info("数据库中没有图片")
-                return
-            
-            logger.info(f"找到 {len(ids)} 张图片")
-            
-            processed_count = 0
-            for i, (image_id, image_path, image_feature) in enumerate(
-                zip(ids, paths, features), 1
-            ):
-                logger.info(f"处理图片 {i}/{len(ids)}: {image_path}")
-                
-                # 检查是否已有标签
-                if self._has_existing_tags('image', file_id=image_id):
-                    logger.info(f"图片 {image_path} 已有标签，跳过")
-                    continue
+                # 已有标签的图片直接在SQL中过滤掉，其特征不会从数据库读出
+                total = get_image_count(session, only_untagged=True)
+                if not total:
+                    logger.info("数据库中没有未添加标签的图片")
+                    return
                 
-                # 处理图片
-                feature_array = np.frombuffer(image_feature, dtype=np.float32).reshape(1, -1)
-                tags = self.process_image(image_id, image_path, feature_array)
+                logger.info(f"找到 {total} 张未添加标签的图片")
                 
-                if tags:
-                    # 更新数据库
-                    if self.update_database_tags('image', image_id, image_path, tags):
-                        processed_count += 1
+                processed_count = 0
+                results = []  # 待写入数据库的 (图片ID, 路径, 标签)，攒够一批再批量重命名和更新
+                i = 0
+                # 每批的相似度写入同一块内存，本批结果在循环中用完后才会被下一批覆盖
+                similarity_buffer = np.empty((IMAGE_BATCH_SIZE, len(self.tag_names)), dtype=np.float32)
+                # 分批读取图片特征，每批只做一次矩阵乘法计算相似度
+                for ids, paths, features in get_image_id_path_features_in_batches(
+                    session, IMAGE_BATCH_SIZE, only_untagged=True
+                ):
+                    feature_matrix = _features_to_matrix(features)
+                    similarities = self.compute_similarity_batch(
+                        feature_matrix, out=similarity_buffer[:len(feature_matrix)]
+                    )
+                    # 整批一起选出每张图片的top标签，循环中只剩转换标签名和写入数据库
+                    top_indices, above_threshold = self._get_top_tag_indices_batch(similarities)
                     
-                    # 重命名文件
-                    if enable_rename:
-                        new_path = self.generate_filename(image_path, tags)
-                        if new_path != image_path:
-                            if self.rename_file(image_path, new_path):
-                                # 更新数据库中的路径
-                                with DatabaseSession() as session:
-                                    record = session.query(Image).filter_by(id=image_id).first()
-                                    if record is not None:
-                                        record.path = new_path
-                                        session.commit()
-            
+                    for image_id, image_path, image_similarities, image_top, image_above in zip(
+                        ids, paths, similarities, top_indices, above_threshold
+                    ):
+                        i += 1
+                        logger.info(f"处理图片 {i}/{total}: {image_path}")
+                        
+                        # 处理图片
+                        tags = self._get_image_tags(image_path, image_similarities, image_top[image_above].tolist())
+                        
+                        if tags:
+                            logger.info(f"图片 {image_path} 的标签: {tags}")
+                            results.append((image_id, image_path, tags))
+                            # 已重命名的文件需要尽快写入新路径，因此定期提交，而不是全部处理完才提交
+                            if len(results) >= DB_COMMIT_INTERVAL:
+                                processed_count += self._apply_image_results(session, results, enable_rename)
+                                results = []
+                
+                processed_count += self._apply_image_results(session, results, enable_rename)
             logger.info(f"图片处理完成，共处理 {processed_count} 张图片")
             
         except Exception as e:
             logger.error(f"处理图片时出错: {e}")
     
+    def _apply_image_results(self, session: Session, results: List[Tuple[int, str, List[str]]],
+                             enable_rename: bool) -> int:
+        """
+        重命名一批图片并把标签和新路径批量写入数据库
+        
+        Args:
+            session: 数据库会话
+            results: (图片ID, 路径, 标签) 列表
+            enable_rename: 是否启用重命名
+            
+        Returns:
+            成功更新的图片数量
+        """
+        updates = [{"id": image_id, "tags": json.dumps(tags, ensure_ascii=False)} for image_id, _, tags in results]
+        
+        if enable_rename and results:
+            # 新文件名在主线程中依次生成，保证不会冲突；移动文件是IO操作，放到线程池中并发执行
+            renames = [(image_path, self.generate_filename(image_path, tags)) for _, image_path, tags in results]
+            with ThreadPoolExecutor(max_workers=RENAME_WORKERS) as executor:
+                renamed = list(executor.map(
+                    lambda rename: rename[0] != rename[1] and self.rename_file(*rename), renames
+                ))
+            for update, (_, new_path), success in zip(updates, renames, renamed):
+                if success:
+                    # 同时更新数据库中的路径
+                    update["path"] = new_path
+        
+        return self._bulk_update_images(session, updates)
+    
+    def _bulk_update_images(self, session: Session, updates: List[dict]) -> int:
+        """
+        批量更新图片的标签和路径并提交
+        
+        Args:
+            session: 数据库会话
+            updates: 更新内容列表，每项包含 id、tags，重命名过的还包含 path
+            
+        Returns:
+            成功更新的图片数量
+        """
+        if not updates:
+            return 0
+        try:
+            session.bulk_update_mappings(Image, updates)
+            session.commit()
+            return len(updates)
+        except Exception as e:
+            session.rollback()
+            logger.error(f"批量更新图片标签失败: {e}")
+            return 0
+    
     def process_all_videos(self, enable_rename: bool = False) -> None:
         """
         处理所有视频
@@ -437,57 +753,68 @@ class AutoTagger:
         logger.info("开始处理所有视频...")
         
         try:
+            # 整个处理过程共用一个数据库会话，不为每个视频单独创建
             with DatabaseSession() as session:
-                video_paths = list(get_video_paths(session))
-            
-            if not video_paths:
-                logger.info("数据库中没有视频")
-                return
-            
-            logger.info(f"找到 {len(video_paths)} 个视频")
-            
-            processed_count = 0
-            for i, video_path in enumerate(video_paths, 1):
-                logger.info(f"处理视频 {i}/{len(video_paths)}: {video_path}")
+                # 已有标签的视频直接在SQL中过滤掉
+                video_paths = list(get_video_paths(session, only_untagged=True))
                 
-                # 检查是否已有标签
-                if self._has_existing_tags('video', file_path=video_path):
-                    logger.info(f"视频 {video_path} 已有标签，跳过")
-                    continue
+                if not video_paths:
+                    logger.info("数据库中没有未添加标签的视频")
+                    return
                 
-                # 处理视频
-                tags = self.process_video(video_path)
+                logger.info(f"找到 {len(video_paths)} 个未添加标签的视频")
                 
-                if tags:
-                    # 更新数据库中该视频的所有帧记录
-                    try:
-                        with DatabaseSession() as session:
-                            video_records = session.query(Video).filter_by(path=video_path).all()
-                            for record in video_records:
-                                record.tags = json.dumps(tags, ensure_ascii=False)
-                            session.commit()
-                        processed_count += 1
-                        
-                    except Exception as e:
-                        logger.error(f"更新视频标签失败: {e}")
-                        continue
+                processed_count = 0
+                # 读取下一个视频的帧特征（数据库I/O）在后台线程中进行，与当前视频的相似度计算、写入数据库和重命名重叠
+                # 读取线程使用单独的数据库会话；每次读完都结束读事务，不长期持有WAL快照
+                with DatabaseSession() as read_session, ThreadPoolExecutor(max_workers=1) as reader:
+                    def read_features(path: str) -> Optional[Tuple[bytes, ...]]:
+                        try:
+                            return self._read_video_features(read_session, path)
+                        finally:
+                            read_session.rollback()
                     
-                    # 重命名文件
-                    if enable_rename:
-                        new_path = self.generate_filename(video_path, tags)
-                        if new_path != video_path:
-                            if self.rename_file(video_path, new_path):
-                                # 更新数据库中的所有相关路径
-                                try:
-                                    with DatabaseSession() as session:
-                                        video_records = session.query(Video).filter_by(path=video_path).all()
-                                        for record in video_records:
-                                            record.path = new_path
-                                        session.commit()
-                                except Exception as e:
-                                    logger.error(f"更新视频路径失败: {e}")
-            
-            logger.info(f"视频处理完成，共处理 {processed_count} 个视频")
+                    next_features = reader.submit(read_features, video_paths[0])
+                    for i, video_path in enumerate(video_paths, 1):
+                        logger.info(f"处理视频 {i}/{len(video_paths)}: {video_path}")
+                        
+                        features = next_features.result()
+                        if i < len(video_paths):
+                            next_features = reader.submit(read_features, video_paths[i])
+                        
+                        # 处理视频
+                        tags = self._tag_video_features(video_path, features)
+                        
+                        if tags:
+                            # 更新数据库中该视频的所有帧记录
+                            try:
+                                session.query(Video).filter_by(path=video_path).update(
+                                    {Video.tags: json.dumps(tags, ensure_ascii=False)}, synchronize_session=False
+                                )
+                                session.commit()
+                                processed_count += 1
+                                
+                            except Exception as e:
+                                session.rollback()
+                                logger.error(f"更新视频标签失败: {e}")
+                                continue
+                            
+                            # 重命名文件
+                            if enable_rename:
+                                new_path = self.generate_filename(video_path, tags)
+                                if new_path != video_path:
+                                    if self.rename_file(video_path, new_path):
+                                        # 更新数据库中的所有相关路径
+                                        try:
+                                            session.query(Video).filter_by(path=video_path).update(
+                                                {Video.path: new_path}, synchronize_session=False
+                                            )
+                                            session.commit()
+                                        except Exception as e:
+                                            session.rollback()
+                                            logger.error(f"更新视频路径失败: {e}")
+                
+                logger.info(f"视频处理完成，共处理 {processed_count} 个视频")
             
         except Exception as e:
             logger.error(f"处理视频时出错: {e}")
@@ -525,6 +852,8 @@ def main():
     parser.add_argument("--threshold", type=float, default=0.3, help="相似度阈值")
     parser.add_argument("--top-k", type=int, default=5, help="返回前k个标签")
     parser.add_argument("--min-frequency", type=int, default=2, help="视频标签最小出现频率")
+    parser.add_argument("--int8", action="store_true", help="使用int8量化向量计算相似度（需要安装simsimd）")
+    parser.add_argument("--backend", choices=SIMILARITY_BACKENDS, default="auto", help="相似度计算方式")
     
     args = parser.parse_args()
     
@@ -533,7 +862,9 @@ def main():
         tagger = AutoTagger(
             similarity_threshold=args.threshold,
             top_k=args.top_k,
-            video_min_frequency=args.min_frequency
+            video_min_frequency=args.min_frequency,
+            use_int8=args.int8,
+            similarity_backend=args.backend
         )
         
         if args.images_only:
@@ -21,6 +21,7 @@ IMAGE_EXTENSIONS = tuple(os.getenv('IMAGE_EXTENSIONS', '.jpg,.jpeg,.png,.gif,.he
 VIDEO_EXTENSIONS = tuple(os.getenv('VIDEO_EXTENSIONS', '.mp4,.flv,.mov,.mkv,.webm,.avi').split(','))  # 支持的视频拓展名，逗号分隔，请填小写
 IGNORE_STRINGS = tuple(os.getenv('IGNORE_STRINGS', 'thumb,avatar,__MACOSX,icons,cache').lower().split(','))  # 如果路径或文件名包含这些字符串，就跳过，逗号分隔，不区分大小写
 FRAME_INTERVAL = max(int(os.getenv('FRAME_INTERVAL', 2)), 1)  # 视频每隔多少秒取一帧，视频展示的时候，间隔小于等于2倍FRAME_INTERVAL的算为同一个素材，同时开始时间和结束时间各延长0.5个FRAME_INTERVAL，要求为整数，最小为1
+FRAME_DEDUP_THRESHOLD = int(os.getenv('FRAME_DEDUP_THRESHOLD', 3))  # 扫描视频时，相邻采样帧的感知哈希（64位）差异不超过这个值就视为重复帧，直接复用上一帧的特征，不再经过模型计算。设为-1关闭
 SCAN_PROCESS_BATCH_SIZE = int(os.getenv('SCAN_PROCESS_BATCH_SIZE', 6))  # 等读取的帧数到这个数量后再一次性输入到模型中进行批量计算，从而提高效率。显存较大可以调高这个值。
 IMAGE_MIN_WIDTH = int(os.getenv('IMAGE_MIN_WIDTH', 64))  # 图片最小宽度，小于此宽度则忽略。不需要可以改成0。
 IMAGE_MIN_HEIGHT = int(os.getenv('IMAGE_MIN_HEIGHT', 64))  # 图片最小高度，小于此高度则忽略。不需要可以改成0。
@@ -42,6 +43,8 @@ AUTO_SAVE_INTERVAL = int(os.getenv('AUTO_SAVE_INTERVAL', 100))  # 扫描自动
 # 英文大模型："openai/clip-vit-large-patch14-336"
 MODEL_NAME = os.getenv('MODEL_NAME', "openai/clip-vit-base-patch16")  # CLIP模型
 DEVICE = os.getenv('DEVICE', 'auto')  # 推理设备，auto/cpu/cuda/mps
+MODEL_FP16 = os.getenv('MODEL_FP16', 'True').lower() == 'true'  # 使用CUDA推理时是否以半精度（FP16）加载模型，速度更快、显存占用减半，对搜索结果几乎没有影响
+MODEL_COMPILE = os.getenv('MODEL_COMPILE', 'False').lower() == 'true'  # 是否用 torch.compile 编译模型，推理更快，但首次推理需要等待编译，依赖 Triton（Windows 一般不可用）
 
 # *****搜索配置*****
 CACHE_SIZE = int(os.getenv('CACHE_SIZE', 64))  # 搜索缓存条目数量，表示缓存最近的n次搜索结果，0表示不缓存。缓存保存在内存中。图片搜索和视频搜索分开缓存。重启程序或扫描完成会清空缓存，或前端点击清空缓存（前端按钮已隐藏）。
@@ -1,13 +1,30 @@
 import datetime
 import logging
 
-from sqlalchemy import asc
+from sqlalchemy import asc, func
 from sqlalchemy.orm import Session
 
 from models import Image, Video, PexelsVideo
 
 logger = logging.getLogger(__name__)
 
+image_change_count = 0  # 本进程内新增、删除图片记录的次数，搜索时据此判断缓存的图片索引是否过期
+
+
+def mark_images_changed():
+    """记录图片表发生了增删"""
+    global image_change_count
+    image_change_count += 1
+
+
+def get_image_version(session: Session):
+    """
+    返回图片表的版本标识，图片增删后会变化
+    :return: (本进程内的增删次数, 有特征的图片数量, 最大id)，后两项用于发现其他进程（如单独运行的扫描）写入的数据
+    """
+    count, max_id = session.query(func.count(Image.id), func.max(Image.id)).filter(Image.features.isnot(None)).one()
+    return image_change_count, count, max_id
+
 
 def get_image_features_by_id(session: Session, image_id: int):
     """
@@ -30,9 +47,12 @@ def get_image_path_by_id(session: Session, id: int):
     return path[0]
 
 
-def get_image_count(session: Session):
-    """获取图片总数"""
-    return session.query(Image).count()
+def get_image_count(session: Session, only_untagged: bool = False):
+    """获取图片总数，only_untagged 为 True 时只统计还没有标签、并且有特征的图片，即自动标签需要处理的图片"""
+    query = session.query(Image)
+    if only_untagged:
+        query = query.filter(Image.tags.is_(None), Image.features.isnot(None))
+    return query.count()
 
 
 def delete_image_if_outdated(session: Session, path: str, modify_time: datetime.datetime, checksum: str = None) -> bool:
@@ -59,6 +79,7 @@ def delete_image_if_outdated(session: Session, path: str, modify_time: datetime.
     logger.info(f"文件有更新：{path}")
     session.delete(record)
     session.commit()
+    mark_images_changed()
     return False
 
 
@@ -89,9 +110,12 @@ def delete_video_if_outdated(session: Session, path: str, modify_time: datetime.
     return False
 
 
-def get_video_paths(session: Session, filter_path: str = None, start_time: int = None, end_time: int = None):
-    """获取所有视频的路径，支持通过路径和修改时间筛选"""
+def get_video_paths(session: Session, filter_path: str = None, start_time: int = None, end_time: int = None,
+                    only_untagged: bool = False):
+    """获取所有视频的路径，支持通过路径和修改时间筛选，only_untagged 为 True 时只返回还没有标签的视频"""
     query = session.query(Video.path, Video.modify_time).distinct()
+    if only_untagged:
+        query = query.filter(Video.tags.is_(None))
     if filter_path:
         query = query.filter(Video.path.like("%" + filter_path + "%"))
     if start_time:
@@ -143,6 +167,7 @@ def add_image(session: Session, path: str, modify_time: datetime.datetime, check
     image = Image(path=path, original_name=original_name, modify_time=modify_time, features=features, checksum=checksum)
     session.add(image)
     session.commit()
+    mark_images_changed()
 
 
 def add_video(session: Session, path: str, modify_time: datetime.datetime, checksum: str, frame_time_features_generator):
@@ -193,6 +218,7 @@ def delete_record_if_not_exist(session: Session, assets: set):
             logger.info(f"文件已删除：{path}")
             session.query(Video).filter_by(path=path).delete()
     session.commit()
+    mark_images_changed()
 
 
 def is_video_exist(session: Session, path: str):
@@ -211,18 +237,30 @@ def is_pexels_video_exist(session: Session, thumbnail_loc: str):
     return False
 
 
-def get_image_id_path_features(session: Session) -> tuple[list[int], list[str], list[bytes]]:
+def get_image_id_path_features_in_batches(session: Session, batch_size: int, only_untagged: bool = False):
     """
-    获取全部图片的 id, 路径, 特征，返回三个列表
+    分批获取全部图片的 id, 路径, 特征，每批返回三个列表，避免一次性把所有特征读入内存。
+    按 id 分页查询，每一批都是独立的短查询，遍历期间不会一直占用数据库的读锁，可以同时写入数据库。
+    :param session: Session, 数据库 session
+    :param batch_size: int, 每批的图片数量
+    :param only_untagged: bool, 是否只返回还没有标签的图片，已有标签的图片的特征不会从数据库读出
+    :return: 返回 (id列表, 路径列表, 特征列表) 元组的生成器
     """
     session.query(Image).filter(Image.features.is_(None)).delete()
     session.commit()
-    query = session.query(Image.id, Image.path, Image.features)
-    try:
-        id_list, path_list, features_list = zip(*query)
-        return id_list, path_list, features_list
-    except ValueError:  # 解包失败
-        return [], [], []
+    last_id = None
+    while True:
+        query = session.query(Image.id, Image.path, Image.features)
+        if only_untagged:
+            query = query.filter(Image.tags.is_(None))
+        if last_id is not None:
+            query = query.filter(Image.id > last_id)
+        rows = query.order_by(Image.id).limit(batch_size).all()
+        if not rows:
+            return
+        id_list, path_list, features_list = zip(*rows)
+        yield id_list, path_list, features_list
+        last_id = id_list[-1]
 
 
 def get_image_id_path_features_filter_by_path_time(session: Session, path: str, start_time: int, end_time: int) -> tuple[
@@ -246,6 +284,18 @@ def get_image_id_path_features_filter_by_path_time(session: Session, path: str,
         return [], [], []
 
 
+def get_image_paths_by_ids(session: Session, ids) -> dict[int, str]:
+    """
+    批量获取图片路径，已被删除的图片不在返回结果中
+    :return: {图片id: 图片路径}
+    """
+    ids = list(ids)
+    paths = {}
+    for start in range(0, len(ids), 500):  # 分批查询，不超过 SQLite 单条语句的参数数量限制
+        paths.update(session.query(Image.id, Image.path).filter(Image.id.in_(ids[start:start + 500])))
+    return paths
+
+
 def search_image_by_path(session: Session, path: str):
     """
     根据路径搜索图片
@@ -5,15 +5,27 @@ Database Migration Script
 """
 
 import logging
+import os
 import sqlite3
 from pathlib import Path
 
 logger = logging.getLogger(__name__)
 
+def _add_column_if_missing(cursor, table, column, definition):
+    """
+    添加列，列已存在时忽略。直接执行ALTER，不需要先用 PRAGMA table_info 查询表结构
+    """
+    try:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    except sqlite3.OperationalError as e:
+        if "duplicate column" not in str(e).lower():
+            raise
+
 def init_database():
     """
     初始化数据库，创建必要的表和列
     """
+    conn = None
     try:
         # 确保instance目录存在
         instance_dir = Path("instance")
@@ -21,10 +33,21 @@ def init_database():
         
         db_path = instance_dir / "assets.db"
         
-        # 连接数据库
+        # 连接数据库，整个迁移过程只使用这一个连接
         conn = sqlite3.connect(str(db_path))
         cursor = conn.cursor()
         
+        # WAL 模式下写入不阻塞读取，synchronous=NORMAL 减少每次提交的fsync
+        # journal_mode 不能在事务中修改，需要在开始事务前设置
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        # 以下设置只对本连接有效：临时数据放在内存中，并加大页缓存，加快迁移中的批量更新
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA cache_size=-64000")
+        
+        # 所有迁移放在同一个事务中，最后只提交一次
+        cursor.execute("BEGIN IMMEDIATE")
+        
         # 检查当前版本
         cursor.execute("PRAGMA user_version")
         current_version = cursor.fetchone()[0]
@@ -79,26 +102,10 @@ def init_database():
         if current_version < 2:
             logger.info("执行迁移 2: 添加缺失的列")
             
-            # 检查并添加image表的original_name列
-            cursor.execute("PRAGMA table_info(image)")
-            columns = [col[1] for col in cursor.fetchall()]
-            if 'original_name' not in columns:
-                cursor.execute("ALTER TABLE image ADD COLUMN original_name VARCHAR(255)")
-            
-            # 检查并添加video表的original_name列
-            cursor.execute("PRAGMA table_info(video)")
-            columns = [col[1] for col in cursor.fetchall()]
-            if 'original_name' not in columns:
-                cursor.execute("ALTER TABLE video ADD COLUMN original_name VARCHAR(255)")
-            
-            # 检查并添加tags列
-            if 'tags' not in columns:
-                cursor.execute("ALTER TABLE video ADD COLUMN tags VARCHAR(1024)")
-            
-            cursor.execute("PRAGMA table_info(image)")
-            columns = [col[1] for col in cursor.fetchall()]
-            if 'tags' not in columns:
-                cursor.execute("ALTER TABLE image ADD COLUMN tags VARCHAR(1024)")
+            # 添加original_name列和tags列，已存在时跳过
+            for table in ("image", "video"):
+                _add_column_if_missing(cursor, table, "original_name", "VARCHAR(255)")
+                _add_column_if_missing(cursor, table, "tags", "VARCHAR(1024)")
             
             cursor.execute("PRAGMA user_version = 2")
             migrations_applied = True
@@ -129,9 +136,34 @@ def init_database():
             cursor.execute("PRAGMA user_version = 3")
             migrations_applied = True
         
+        # 版本 4: 补全旧数据缺失的original_name
+        if current_version < 4:
+            logger.info("执行迁移 4: 补全original_name")
+            
+            # 注册与 database.py 中相同的取文件名函数，每个表只需一条UPDATE语句，不逐行更新
+            conn.create_function("basename", 1, os.path.basename, deterministic=True)
+            for table in ("image", "video"):
+                cursor.execute(
+                    f"UPDATE {table} SET original_name = basename(path) "
+                    f"WHERE original_name IS NULL OR original_name = ''"
+                )
+                logger.info(f"{table} 表补全了 {cursor.rowcount} 条记录的original_name")
+            
+            cursor.execute("PRAGMA user_version = 4")
+            migrations_applied = True
+        
+        # 表结构和数据变化后重新收集索引统计信息，让查询优化器选择正确的索引
+        if migrations_applied:
+            cursor.execute("ANALYZE")
+        
         # 提交更改
         conn.commit()
-        conn.close()
+        # 关闭连接前让 SQLite 按需更新过期的统计信息，没有需要更新的内容时几乎没有开销
+        # 迁移已经提交，优化失败不影响迁移结果，只记录警告
+        try:
+            cursor.execute("PRAGMA optimize")
+        except Exception as e:
+            logger.warning(f"数据库优化失败: {e}")
         
         if migrations_applied:
             logger.info("数据库迁移完成")
@@ -141,8 +173,13 @@ def init_database():
         return True
         
     except Exception as e:
+        if conn is not None:
+            conn.rollback()
         logger.error(f"数据库迁移失败: {e}")
         return False
+    finally:
+        if conn is not None:
+            conn.close()
 
 def reset_database():
     """
@@ -13,14 +13,11 @@ from auto_tag import AutoTagger
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def test_video_features():
+def test_video_features(tagger):
     """测试视频特征处理"""
     print("🔍 调试视频标签问题")
     print("="*50)
     
-    # 创建自动标签器
-    tagger = AutoTagger()
-    
     # 获取第一个视频进行测试
     with DatabaseSession() as session:
         video_paths = list(get_video_paths(session))
@@ -46,25 +43,25 @@ def test_video_features():
     first_feature = features[0]
     print(f"第一个帧特征大小: {len(first_feature)} 字节")
     
-    # 转换为numpy数组
+    # 转换为numpy数组，所有帧一次性拼成 (帧数, 维度) 的矩阵
     try:
-        feature_array = np.frombuffer(first_feature, dtype=np.float32)
+        feature_array = np.frombuffer(b"".join(features), dtype=np.float32).reshape(len(features), -1)
         print(f"特征数组形状: {feature_array.shape}")
         print(f"特征数组类型: {feature_array.dtype}")
         print(f"特征数组范围: {feature_array.min():.4f} 到 {feature_array.max():.4f}")
         
-        # 重塑为2D数组
-        feature_array = feature_array.reshape(1, -1)
-        print(f"重塑后形状: {feature_array.shape}")
-        
-        # 计算相似度
-        similarities = tagger.compute_similarity(feature_array, tagger.tag_vectors)
+        # 所有帧只做一次矩阵乘法计算相似度
+        similarities = tagger.compute_similarity_batch(feature_array)
         print(f"相似度数组形状: {similarities.shape}")
         print(f"相似度范围: {similarities.min():.4f} 到 {similarities.max():.4f}")
         
-        # 获取标签
-        top_tags = tagger.get_top_tags(similarities, top_k=5, threshold=0.3)
-        print(f"前5个标签: {top_tags}")
+        # 获取第一个帧的标签
+        top_tags = tagger.get_top_tags(similarities[0], top_k=5, threshold=0.3)
+        print(f"第一个帧前5个标签: {top_tags}")
+        
+        # 统计所有帧合并后的视频标签
+        video_tags = tagger._get_video_tags(test_video, similarities)
+        print(f"视频标签: {video_tags}")
         
         if top_tags:
             print("✅ 标签生成成功！")
@@ -76,33 +73,29 @@ def test_video_features():
         import traceback
         traceback.print_exc()
 
-def test_tag_vectors():
+def test_tag_vectors(tagger):
     """测试标签向量"""
     print("\n🔍 测试标签向量")
     print("="*30)
     
-    tagger = AutoTagger()
-    
-    print(f"标签向量形状: {tagger.tag_vectors.shape}")
-    print(f"标签向量类型: {tagger.tag_vectors.dtype}")
-    print(f"标签向量范围: {tagger.tag_vectors.min():.4f} 到 {tagger.tag_vectors.max():.4f}")
+    print(f"标签向量形状: {tagger.tag_matrix.shape}")
+    print(f"标签向量类型: {tagger.tag_matrix.dtype}")
+    print(f"标签向量范围: {tagger.tag_matrix.min():.4f} 到 {tagger.tag_matrix.max():.4f}")
     
     # 显示前几个标签
     from tag_vocabulary import ENGLISH_TAGS
     print(f"前10个英文标签: {ENGLISH_TAGS[:10]}")
 
-def test_similarity_threshold():
+def test_similarity_threshold(tagger):
     """测试相似度阈值"""
     print("\n🔍 测试相似度阈值")
     print("="*30)
     
-    tagger = AutoTagger()
-    
     # 创建一个测试特征（全零）
-    test_feature = np.zeros((1, tagger.tag_vectors.shape[1]), dtype=np.float32)
+    test_feature = np.zeros((1, tagger.tag_matrix.shape[1]), dtype=np.float32)
     
     # 计算相似度
-    similarities = tagger.compute_similarity(test_feature, tagger.tag_vectors)
+    similarities = tagger.compute_similarity(test_feature)
     
     print(f"测试特征相似度范围: {similarities.min():.4f} 到 {similarities.max():.4f}")
     
@@ -112,6 +105,8 @@ def test_similarity_threshold():
         print(f"阈值 {threshold}: {len(top_tags)} 个标签")
 
 if __name__ == "__main__":
-    test_tag_vectors()
-    test_similarity_threshold()
-    test_video_features() 
\ No newline at end of file
+    # 三个测试共用一个自动标签器，标签向量只加载一次
+    tagger = AutoTagger()
+    test_tag_vectors(tagger)
+    test_similarity_threshold(tagger)
+    test_video_features(tagger) 
\ No newline at end of file
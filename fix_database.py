@@ -10,6 +10,9 @@ from pathlib import Path
 
 logger = logging.getLogger(__name__)
 
+# 恢复数据时读取和插入的列，顺序与INSERT语句一致
+VIDEO_COLUMNS = ('path', 'original_name', 'frame_time', 'modify_time', 'features', 'checksum', 'tags')
+
 def fix_video_table():
     """
     修复video表的约束问题
@@ -24,10 +27,16 @@ def fix_video_table():
         cursor = conn.cursor()
         
         logger.info("开始修复video表...")
+        # 备份、删表、重建和恢复放在同一个事务中，中途出错时不会丢失数据
+        cursor.execute("BEGIN")
         
         # 1. 备份现有数据
         logger.info("备份现有数据...")
-        cursor.execute("SELECT * FROM video")
+        # 按列名读取，旧表中不存在的列（如tags）用NULL补齐，读出的每一行可以直接插入新表
+        cursor.execute("PRAGMA table_info(video)")
+        existing_columns = {col[1] for col in cursor.fetchall()}
+        select_columns = [c if c in existing_columns else f"NULL AS {c}" for c in VIDEO_COLUMNS]
+        cursor.execute(f"SELECT {', '.join(select_columns)} FROM video")
         video_data = cursor.fetchall()
         logger.info(f"备份了 {len(video_data)} 条视频记录")
         
@@ -57,34 +66,25 @@ def fix_video_table():
         
         # 5. 恢复数据（跳过有问题的记录）
         logger.info("恢复数据...")
-        restored_count = 0
+        # 在内存中按path+frame_time去重，不再每条记录查询一次数据库
+        seen = set()
+        rows_to_restore = []
         skipped_count = 0
         
         for row in video_data:
-            try:
-                # 检查是否有重复的path+frame_time组合
-                cursor.execute(
-                    "SELECT COUNT(*) FROM video WHERE path = ? AND frame_time = ?",
-                    (row[1], row[3])  # path, frame_time
-                )
-                if cursor.fetchone()[0] == 0:
-                    # 插入数据，跳过checksum如果为NULL
-                    if row[5] is not None:  # checksum不为NULL
-                        cursor.execute("""
-                            INSERT INTO video (path, original_name, frame_time, modify_time, features, checksum, tags)
-                            VALUES (?, ?, ?, ?, ?, ?, ?)
-                        """, (row[1], row[2], row[3], row[4], row[6], row[5], row[7] if len(row) > 7 else None))
-                    else:
-                        cursor.execute("""
-                            INSERT INTO video (path, original_name, frame_time, modify_time, features, tags)
-                            VALUES (?, ?, ?, ?, ?, ?)
-                        """, (row[1], row[2], row[3], row[4], row[6], row[7] if len(row) > 7 else None))
-                    restored_count += 1
-                else:
-                    skipped_count += 1
-            except Exception as e:
-                logger.warning(f"跳过有问题的记录: {e}")
+            path, _, frame_time = row[:3]
+            if path is None or (path, frame_time) in seen:
                 skipped_count += 1
+                continue
+            seen.add((path, frame_time))
+            rows_to_restore.append(row)
+        
+        # 所有记录在同一个事务中批量插入，checksum为NULL时直接插入NULL
+        cursor.executemany(f"""
+            INSERT INTO video ({', '.join(VIDEO_COLUMNS)})
+            VALUES ({', '.join('?' * len(VIDEO_COLUMNS))})
+        """, rows_to_restore)
+        restored_count = len(rows_to_restore)
         
         # 6. 提交更改
         conn.commit()
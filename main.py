@@ -1,5 +1,4 @@
 import logging
-import shutil
 import threading
 from functools import wraps
 from io import BytesIO
@@ -20,7 +19,7 @@ from search import (
     search_video_by_text_path_time,
     search_pexels_video_by_text,
 )
-from utils import crop_video, get_hash, resize_image_with_aspect_ratio
+from utils import crop_video, get_hash, resize_image_with_aspect_ratio, reset_temp_dir
 
 logger = logging.getLogger(__name__)
 app = Flask(__name__)
@@ -29,13 +28,10 @@ app.secret_key = "https://github.com/chn-lee-yumi/MaterialSearch"
 scanner = Scanner()
 
 
-def init():
+def run_database_migration():
     """
-    清理和创建临时文件夹，初始化扫描线程（包括数据库初始化），根据AUTO_SCAN决定是否开启自动扫描线程
+    运行数据库迁移
     """
-    global scanner
-    
-    # 运行数据库迁移
     try:
         from database_migration import init_database
         logger.info("开始数据库迁移...")
@@ -45,15 +41,26 @@ def init():
             logger.error("数据库迁移失败")
     except Exception as e:
         logger.error(f"数据库迁移出错: {e}")
+
+
+def init():
+    """
+    清理和创建临时文件夹，初始化扫描线程（包括数据库初始化），根据AUTO_SCAN决定是否开启自动扫描线程
+    """
+    global scanner
+    
+    # 数据库迁移与下面的路径检查、临时目录清理互不依赖，放到线程中同时进行
+    migration_thread = threading.Thread(target=run_database_migration)
+    migration_thread.start()
     
     # 检查ASSETS_PATH是否存在
     for path in ASSETS_PATH:
         if not os.path.isdir(path):
             logger.warning(f"ASSETS_PATH检查：路径 {path} 不存在！请检查输入的路径是否正确！")
-    # 删除临时目录中所有文件
-    shutil.rmtree(f'{TEMP_PATH}', ignore_errors=True)
-    os.makedirs(f'{TEMP_PATH}/upload')
-    os.makedirs(f'{TEMP_PATH}/video_clips')
+    # 清空临时目录，旧文件在后台删除，不阻塞启动
+    reset_temp_dir(TEMP_PATH, ['upload', 'video_clips'])
+    # 扫描线程初始化时会读取数据库，需要等待迁移完成
+    migration_thread.join()
     # 初始化扫描线程
     scanner.init()
     if AUTO_SCAN:
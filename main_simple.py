@@ -5,11 +5,10 @@ MaterialSearch 简化主程序
 使用简化的配置和初始化模块，移除复杂的加密逻辑
 """
 
+import base64
 import logging
-import shutil
 import threading
 from functools import wraps
-from io import BytesIO
 
 from flask import Flask, abort, jsonify, redirect, request, send_file, session, url_for
 
@@ -30,7 +29,7 @@ from search import (
     search_video_by_text_path_time,
     search_pexels_video_by_text,
 )
-from utils import crop_video, get_hash, resize_image_with_aspect_ratio
+from utils import crop_video, get_hash, get_string_hash, resize_image_with_aspect_ratio, reset_temp_dir
 
 logger = logging.getLogger(__name__)
 app = Flask(__name__)
@@ -39,16 +38,10 @@ app.secret_key = "MaterialSearch-Simple-Version"
 scanner = Scanner()
 
 
-def init():
+def run_database_migration():
     """
-    清理和创建临时文件夹，初始化扫描线程（包括数据库初始化），根据AUTO_SCAN决定是否开启自动扫描线程
+    运行数据库迁移
     """
-    global scanner
-    
-    # 运行系统初始化
-    init_system()
-    
-    # 运行数据库迁移
     try:
         from database_migration import init_database
         logger.info("开始数据库迁移...")
@@ -58,17 +51,31 @@ def init():
             logger.error("数据库迁移失败")
     except Exception as e:
         logger.error(f"数据库迁移出错: {e}")
+
+
+def init():
+    """
+    清理和创建临时文件夹，初始化扫描线程（包括数据库初始化），根据AUTO_SCAN决定是否开启自动扫描线程
+    """
+    global scanner
+    
+    # 运行系统初始化
+    init_system()
+    
+    # 数据库迁移与下面的路径检查、临时目录清理互不依赖，放到线程中同时进行
+    migration_thread = threading.Thread(target=run_database_migration)
+    migration_thread.start()
     
     # 检查ASSETS_PATH是否存在
     for path in ASSETS_PATH:
         if not os.path.isdir(path):
             logger.warning(f"ASSETS_PATH检查：路径 {path} 不存在！请检查输入的路径是否正确！")
     
-    # 删除临时目录中所有文件
-    shutil.rmtree(f'{TEMP_PATH}', ignore_errors=True)
-    os.makedirs(f'{TEMP_PATH}/upload')
-    os.makedirs(f'{TEMP_PATH}/video_clips')
+    # 清空临时目录，旧文件在后台删除，不阻塞启动
+    reset_temp_dir(TEMP_PATH, ['upload', 'video_clips'])
     
+    # 扫描线程初始化时会读取数据库，需要等待迁移完成
+    migration_thread.join()
     # 初始化扫描线程
     scanner.init()
     if AUTO_SCAN:
@@ -227,18 +234,28 @@ def api_match():
 def api_get_image(image_id):
     """获取图片"""
     try:
-        image_path = get_image_path_by_id(image_id)
-        if not image_path or not os.path.exists(image_path):
+        with DatabaseSession() as session:
+            image_path = get_image_path_by_id(session, image_id)
+        if not image_path:
             abort(404)
         
-        # 检查文件大小
-        file_size = os.path.getsize(image_path)
-        if file_size > 50 * 1024 * 1024:  # 50MB
-            # 大文件需要调整大小
-            resized_image = resize_image_with_aspect_ratio(image_path, max_width=1920, max_height=1080)
-            return send_file(BytesIO(resized_image), mimetype='image/jpeg')
+        # 一次 stat 同时得到文件大小和修改时间，文件不存在时抛出 FileNotFoundError，返回404
+        file_stat = os.stat(image_path)
+        if file_stat.st_size > 50 * 1024 * 1024:  # 50MB
+            # 大文件需要调整大小，结果按路径和修改时间缓存在临时目录，同一张图片只需解码压缩一次
+            cache_key = get_string_hash(f"{image_path}:{file_stat.st_mtime}")
+            resized_path = os.path.join(TEMP_PATH, 'resized', f"{cache_key}.jpg")
+            if not os.path.exists(resized_path):
+                os.makedirs(os.path.dirname(resized_path), exist_ok=True)
+                resized_image = resize_image_with_aspect_ratio(image_path, (1920, 1080), convert_rgb=True)
+                # 先写临时文件再替换，避免并发请求读到写了一半的文件
+                tmp_path = f"{resized_path}.{threading.get_ident()}.tmp"
+                resized_image.save(tmp_path, 'JPEG', quality=90)
+                os.replace(tmp_path, resized_path)
+            return send_file(resized_path, mimetype='image/jpeg', conditional=True)
         
-        return send_file(image_path)
+        # conditional=True 支持 If-Modified-Since / Range 请求，浏览器缓存命中时直接返回304
+        return send_file(image_path, conditional=True)
     except Exception as e:
         logger.error(f"获取图片失败: {e}")
         abort(404)
@@ -249,10 +266,11 @@ def api_get_image(image_id):
 def api_get_video(video_path):
     """获取视频"""
     try:
-        # 解码视频路径
-        video_path = video_path.replace('_', '/')
-        if not is_video_exist(video_path):
-            abort(404)
+        # 解码视频路径（search.py 中用 base64.urlsafe_b64encode 编码）
+        video_path = base64.urlsafe_b64decode(video_path).decode()
+        with DatabaseSession() as session:
+            if not is_video_exist(session, video_path):  # 如果路径不在数据库中，则返回404，防止任意文件读取攻击
+                abort(404)
         
         return send_file(video_path)
     except Exception as e:
@@ -268,10 +286,11 @@ def api_get_video(video_path):
 def api_download_video_clip(video_path, start_time, end_time):
     """下载视频片段"""
     try:
-        # 解码视频路径
-        video_path = video_path.replace('_', '/')
-        if not is_video_exist(video_path):
-            abort(404)
+        # 解码视频路径（search.py 中用 base64.urlsafe_b64encode 编码）
+        video_path = base64.urlsafe_b64decode(video_path).decode()
+        with DatabaseSession() as session:
+            if not is_video_exist(session, video_path):  # 如果路径不在数据库中，则返回404，防止任意文件读取攻击
+                abort(404)
         
         # 裁剪视频
         output_path = crop_video(video_path, start_time, end_time, VIDEO_EXTENSION_LENGTH)
@@ -296,11 +315,10 @@ def api_upload():
         if file.filename == '':
             return "没有选择文件", 400
         
-        # 保存文件
-        filename = get_hash(file.read()) + os.path.splitext(file.filename)[1]
+        # 保存文件。hash 按块从流中读取计算，不把整个文件读入内存，计算完会自动回到开头
+        filename = get_hash(file.stream) + os.path.splitext(file.filename)[1]
         file_path = os.path.join(TEMP_PATH, 'upload', filename)
         
-        file.seek(0)  # 重置文件指针
         file.save(file_path)
         
         session['upload_file_path'] = file_path
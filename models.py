@@ -1,7 +1,7 @@
 import os
 
 from sqlalchemy import BINARY, Column, DateTime, Integer, String, Text
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
@@ -29,6 +29,22 @@ engine_pexels_video = create_engine(
 DatabaseSessionPexelsVideo = sessionmaker(autocommit=False, autoflush=False, bind=engine_pexels_video)
 
 
+def set_sqlite_pragma(dbapi_connection, connection_record):
+    """
+    新建SQLite连接时设置WAL模式，写入时不阻塞读取；WAL模式下 synchronous=NORMAL 仍然安全，并减少每次提交的fsync
+    连接由连接池复用，每个连接只设置一次
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
+if engine.dialect.name == "sqlite":
+    event.listen(engine, "connect", set_sqlite_pragma)
+event.listen(engine_pexels_video, "connect", set_sqlite_pragma)
+
+
 def create_tables():
     """
     创建数据库表
@@ -1,27 +1,72 @@
 # 预处理图片和视频，建立索引，加快搜索速度
 import logging
+import queue
+import threading
 import traceback
 import os
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from functools import lru_cache
-from io import BytesIO
 
 import cv2
 import numpy as np
 import requests
 import torch
+import torch.nn.functional as F
 from PIL import Image
+from requests.adapters import HTTPAdapter
 from tqdm import trange
 from transformers import AutoModelForZeroShotImageClassification, AutoProcessor
 
 from config import *
 
+try:  # 可选依赖，安装后使用 PyAV 解码视频
+    import av
+except ImportError:
+    av = None
+
 logger = logging.getLogger(__name__)
 
+# 下载网络图片复用同一个 Session，连接池中的 TCP/TLS 连接可以重复使用
+http_session = requests.Session()
+http_session.mount("http://", HTTPAdapter(pool_connections=16, pool_maxsize=16))
+http_session.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=16))
+
+# 解码图片的线程池，cv2 和 PIL 解码时会释放 GIL，多线程可以同时解码一个批次里的多张图片
+image_loader = ThreadPoolExecutor(max_workers=max(min(SCAN_PROCESS_BATCH_SIZE, os.cpu_count() or 1), 1), thread_name_prefix="image_loader")
+
 # 设置环境变量以支持离线模式
 os.environ.setdefault('HF_HUB_OFFLINE', '0')
 os.environ.setdefault('TRANSFORMERS_OFFLINE', '0')
 
+def get_model_dtype():
+    """
+    获取模型推理使用的精度，CUDA 上默认使用半精度，其它设备保持 FP32
+    :return: torch.dtype
+    """
+    if MODEL_FP16 and str(DEVICE).startswith('cuda'):
+        return torch.float16
+    return torch.float32
+
+
+def load_clip_model(model_name, **kwargs):
+    """
+    加载 CLIP 模型，优先使用 PyTorch 的 scaled_dot_product_attention 注意力实现（支持的 GPU 上会调用 FlashAttention），
+    模型或 transformers 版本不支持时退回默认实现
+    """
+    try:
+        model = AutoModelForZeroShotImageClassification.from_pretrained(
+            model_name, torch_dtype=get_model_dtype(), attn_implementation="sdpa", **kwargs
+        )
+    except ValueError as e:
+        logger.info(f"模型不支持 sdpa 注意力，使用默认实现：{e}")
+        model = AutoModelForZeroShotImageClassification.from_pretrained(
+            model_name, torch_dtype=get_model_dtype(), **kwargs
+        )
+    return model.to(DEVICE)
+
+
 def load_model_with_retry(model_name, max_retries=3, timeout=60):
     """
     带重试机制的模型加载函数
@@ -31,11 +76,11 @@ def load_model_with_retry(model_name, max_retries=3, timeout=60):
             logger.info(f"正在加载模型 {model_name} (尝试 {attempt + 1}/{max_retries})...")
             
             # 设置更长的超时时间
-            model = AutoModelForZeroShotImageClassification.from_pretrained(
+            model = load_clip_model(
                 model_name, 
                 local_files_only=False,
                 trust_remote_code=True
-            ).to(DEVICE)
+            )
             
             processor = AutoProcessor.from_pretrained(
                 model_name,
@@ -78,10 +123,10 @@ def load_model_offline(model_name):
         os.environ['HF_HUB_OFFLINE'] = '1'
         os.environ['TRANSFORMERS_OFFLINE'] = '1'
         
-        model = AutoModelForZeroShotImageClassification.from_pretrained(
+        model = load_clip_model(
             model_name,
             local_files_only=True
-        ).to(DEVICE)
+        )
         
         processor = AutoProcessor.from_pretrained(
             model_name,
@@ -105,7 +150,74 @@ except Exception as e:
     processor = None
     logger.warning("模型加载失败，搜索功能将不可用。请检查网络连接或手动下载模型文件。")
 
+# CUDA 上编译时，图片批次会补齐到 SCAN_PROCESS_BATCH_SIZE，视觉编码器用固定形状捕获为 CUDA Graph，每个批次只需一次启动
+use_cuda_graphs = model is not None and MODEL_COMPILE and str(DEVICE).startswith('cuda')
+
+if model is not None and MODEL_COMPILE:
+    # 只编译视觉和文字编码器。文字长度会变化，所以使用动态形状，避免反复重新编译
+    if hasattr(model, "vision_model"):
+        if use_cuda_graphs:
+            model.vision_model = torch.compile(model.vision_model, mode="reduce-overhead")
+        else:
+            model.vision_model = torch.compile(model.vision_model, dynamic=True)
+    if hasattr(model, "text_model"):
+        model.text_model = torch.compile(model.text_model, dynamic=True)
+    logger.info("已启用 torch.compile，首次推理需要等待编译")
+
+
+def get_model_input_size():
+    """
+    获取模型输入图片的边长
+    :return: int, 边长，取不到时返回 224
+    """
+    size = getattr(getattr(processor, "image_processor", None), "size", None)
+    if isinstance(size, dict) and size:  # {"shortest_edge": 224} 或 {"height": 224, "width": 224}
+        return min(size.values())
+    if isinstance(size, int):
+        return size
+    return 224
+
 
+model_input_size = get_model_input_size()
+
+
+def shrink_image(image):
+    """
+    过大的图片先用 INTER_AREA 缩小到短边为模型输入边长的两倍，减少后续复制和预处理的数据量。
+    最终的缩放和裁剪仍由 processor 完成，对特征几乎没有影响
+    :param image: <class 'numpy.nparray'>, 图片数据，HWC
+    :return: <class 'numpy.nparray'>, 缩小后的图片数据
+    """
+    height, width = image.shape[:2]
+    target = 2 * model_input_size
+    if min(height, width) <= target:
+        return image
+    scale = target / min(height, width)
+    return cv2.resize(image, (max(round(width * scale), 1), max(round(height * scale), 1)), interpolation=cv2.INTER_AREA)
+
+
+def preprocess_images(images):
+    """
+    预处理图片，返回模型输入。缩放、裁剪仍由 processor 完成，
+    rescale、normalize 合并为一次 float32 向量运算，减少逐张图片的中间数组
+    :param images: 图片或图片列表
+    :return: <class 'torch.Tensor'>, pixel_values，shape=(n, 3, h, w)
+    """
+    image_processor = getattr(processor, "image_processor", None)
+    if image_processor is None:  # 旧版本 transformers 没有 image_processor，直接使用 processor
+        return processor(images=images, return_tensors="pt")["pixel_values"]
+    # 只请求 "pt"：新版 transformers 默认的快速 image processor 不支持其他 return_tensors
+    pixel_values = image_processor(images=images, do_rescale=False, do_normalize=False, return_tensors="pt")["pixel_values"]
+    # (x / 255 - mean) / std == (x - 255 * mean) * (1 / (255 * std))
+    mean = torch.tensor(image_processor.image_mean, dtype=torch.float32).reshape(1, -1, 1, 1) * 255
+    inv_std = 1 / (torch.tensor(image_processor.image_std, dtype=torch.float32).reshape(1, -1, 1, 1) * 255)
+    pixel_values = pixel_values.to(torch.float32)
+    pixel_values -= mean
+    pixel_values *= inv_std
+    return pixel_values
+
+
+@torch.inference_mode()
 def get_image_feature(images):
     """
     :param images: 图片列表
@@ -121,10 +233,18 @@ def get_image_feature(images):
     
     features = None
     try:
-        inputs = processor(images=images, return_tensors="pt")["pixel_values"].to(DEVICE)
-        features = model.get_image_features(inputs)
-        normalized_features = features / torch.norm(features, dim=1, keepdim=True)  # 归一化，方便后续计算余弦相似度
-        features = normalized_features.detach().cpu().numpy()
+        inputs = preprocess_images(images)
+        if str(DEVICE).startswith('cuda'):  # 使用锁页内存异步上传到显存
+            inputs = inputs.pin_memory()
+        inputs = inputs.to(DEVICE, dtype=model.dtype, non_blocking=True)
+        batch_size = len(inputs)
+        if use_cuda_graphs and batch_size < SCAN_PROCESS_BATCH_SIZE:  # 补齐批次，复用同一个 CUDA Graph
+            padding = inputs.new_zeros((SCAN_PROCESS_BATCH_SIZE - batch_size, *inputs.shape[1:]))
+            inputs = torch.cat([inputs, padding])
+        # 半精度模型的输出转回 FP32，保证数据库中特征格式不变
+        features = model.get_image_features(inputs)[:batch_size].float()
+        normalized_features = F.normalize(features, p=2, dim=1)  # 归一化，方便后续计算余弦相似度
+        features = normalized_features.cpu().numpy()
     except Exception as e:
         logger.exception("处理图片报错：type=%s error=%s" % (type(images), repr(e)))
         traceback.print_stack()
@@ -149,6 +269,18 @@ def get_image_data(path: str, ignore_small_images: bool = True):
     :return: <class 'numpy.nparray'>, 图片数据，如果出错返回 None
     """
     try:
+        # 优先用 cv2 解码，比 PIL 快；读成字节再解码，支持中文路径。
+        # 忽略 EXIF 方向，与 PIL 的结果保持一致，避免和已入库的特征不一致
+        with open(path, 'rb') as f:
+            buffer = np.frombuffer(f.read(), dtype=np.uint8)
+        image = cv2.imdecode(buffer, cv2.IMREAD_COLOR | cv2.IMREAD_IGNORE_ORIENTATION)
+        if image is not None:
+            if ignore_small_images:
+                height, width = image.shape[:2]
+                if width < IMAGE_MIN_WIDTH or height < IMAGE_MIN_HEIGHT:
+                    return None
+            return cv2.cvtColor(shrink_image(image), cv2.COLOR_BGR2RGB)
+        # cv2 不支持的格式（如 gif、heic）再用 PIL 打开
         image = Image.open(path)
         if ignore_small_images:
             width, height = image.size
@@ -157,7 +289,7 @@ def get_image_data(path: str, ignore_small_images: bool = True):
                 # processor 中也会这样预处理 Image
         # 在这里提前转为 np.array 避免到时候抛出异常
         image = image.convert('RGB')
-        image = np.array(image)
+        image = shrink_image(np.array(image))
         return image
     except Exception as e:
         logger.exception("打开图片报错：path=%s error=%s" % (path, repr(e)))
@@ -184,19 +316,19 @@ def process_images(path_list, ignore_small_images=True):
     处理图片，返回图片特征
     :param path_list: string, 图片路径列表
     :param ignore_small_images: bool, 是否忽略尺寸过小的图片
-    :return: <class 'numpy.nparray'>, 图片特征
+    :return: (list[string], <class 'numpy.nparray'>), (成功读取的图片路径列表, 图片特征)
     """
-    images = []
-    for path in path_list.copy():
-        image = get_image_data(path, ignore_small_images)
+    kept_paths, images = [], []  # 重新构建列表，不修改传入的 path_list
+    loaded_images = image_loader.map(lambda path: get_image_data(path, ignore_small_images), path_list)
+    for path, image in zip(path_list, loaded_images):
         if image is None:
-            path_list.remove(path)
             continue
+        kept_paths.append(path)
         images.append(image)
     if not images:
         return None, None
     feature = get_image_feature(images)
-    return path_list, feature
+    return kept_paths, feature
 
 
 def process_web_image(url):
@@ -206,10 +338,11 @@ def process_web_image(url):
     :return: <class 'numpy.nparray'>, 图片特征
     """
     try:
-        response = requests.get(url, stream=True)
-        response.raise_for_status()  # 检查HTTP错误
-        image_data = response.content
-        image = Image.open(BytesIO(image_data))
+        with http_session.get(url, stream=True, timeout=10) as response:
+            response.raise_for_status()  # 检查HTTP错误
+            response.raw.decode_content = True  # 按 Content-Encoding 解压
+            image = Image.open(response.raw)
+            image.load()  # 在连接关闭前读取完图片数据
     except Exception as e:
         logger.warning("获取图片报错：%s %s" % (url, repr(e)))
         return None
@@ -238,7 +371,7 @@ def get_frames(video: cv2.VideoCapture):
         if not ret:
             break
         ids.append(current_frame // frame_rate)
-        frames.append(frame)
+        frames.append(shrink_image(frame))
         if len(frames) == SCAN_PROCESS_BATCH_SIZE:
             yield ids, frames
             ids = []
@@ -248,44 +381,205 @@ def get_frames(video: cv2.VideoCapture):
     yield ids, frames
 
 
-def process_video(path):
+def get_frames_av(path):
     """
-    处理视频并返回处理完成的数据
-    返回一个生成器，每调用一次则返回视频下一个帧的数据
+    使用 PyAV 获取视频的帧数据。按时间戳采样，兼容可变帧率视频；
+    多线程解码，并且只有被采样的帧才会转换成像素数组，跳过的帧不做颜色转换
     :param path: string, 视频路径
-    :return: [int, <class 'numpy.nparray'>], [当前是第几帧（被采集的才算），图片特征]
+    :return: (list[int], list[array]) (帧编号列表, 帧像素数据列表) 元组
     """
-    logger.info(f"处理视频中：{path}")
-    video = None
-    try:
-        video = cv2.VideoCapture(path)
-        for ids, frames in get_frames(video):
-            if not frames:
-                continue
-            features = get_image_feature(frames)
-            if features is None:
-                logger.warning("features is None in process_video")
+    with av.open(path) as container:
+        stream = container.streams.video[0]
+        stream.thread_type = "AUTO"
+        ids, frames = [], []
+        next_time = 0
+        for frame in container.decode(stream):
+            if frame.time is None or frame.time < next_time:
                 continue
-            for id, feature in zip(ids, features):
-                yield id, feature
-    except Exception as e:
-        logger.exception("处理视频报错：path=%s error=%s" % (path, repr(e)))
-        traceback.print_stack()
-        if video is not None:
-            frame_rate = round(video.get(cv2.CAP_PROP_FPS))
-            total_frames = video.get(cv2.CAP_PROP_FRAME_COUNT)
-            print(f"fps: {frame_rate} total: {total_frames}")
-            video.release()
+            current_time = int(frame.time) // FRAME_INTERVAL * FRAME_INTERVAL
+            next_time = current_time + FRAME_INTERVAL
+            ids.append(current_time)
+            frames.append(shrink_image(frame.to_ndarray(format="bgr24")))  # 与 cv2 读出的帧格式保持一致
+            if len(frames) == SCAN_PROCESS_BATCH_SIZE:
+                yield ids, frames
+                ids = []
+                frames = []
+        yield ids, frames
+
+
+def read_video_frames(path):
+    """
+    读取视频的帧数据，安装了 PyAV 时使用 PyAV，否则使用 cv2
+    :param path: string, 视频路径
+    :return: (list[int], list[array]) (帧编号列表, 帧像素数据列表) 元组
+    """
+    if av is not None:
+        yield from get_frames_av(path)
         return
+    video = cv2.VideoCapture(path)
+    try:
+        yield from get_frames(video)
+    finally:
+        video.release()
+
+
+def get_frame_hash(frame):
+    """
+    计算帧的差值哈希（dHash）和平均亮度，用于判断相邻的采样帧是否重复
+    :param frame: <class 'numpy.nparray'>, 帧像素数据，BGR
+    :return: (<class 'numpy.nparray'>, float), (64 位哈希, 平均亮度)
+    """
+    gray = cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), (9, 8), interpolation=cv2.INTER_AREA)
+    return gray[:, 1:] > gray[:, :-1], float(gray.mean())
+
+
+def is_duplicate_frame(frame_hash, last_hash):
+    """
+    判断两帧是否重复：dHash 的汉明距离不超过 FRAME_DEDUP_THRESHOLD，并且平均亮度接近（纯色画面的 dHash 都相同，需要用亮度区分）
+    """
+    if FRAME_DEDUP_THRESHOLD < 0 or last_hash is None:
+        return False
+    bits, brightness = frame_hash
+    last_bits, last_brightness = last_hash
+    return np.count_nonzero(bits != last_bits) <= FRAME_DEDUP_THRESHOLD and abs(brightness - last_brightness) <= 8
+
+
+def decode_videos(path_list, frame_queue, stop_event):
+    """
+    解码视频的生产者线程：依次解码视频，把采样帧放入队列，和主线程的模型计算同时进行
+    队列中的元素：("frame", 视频路径, 帧编号, 帧像素数据（重复帧为 None）)、("error", 视频路径)、("end", 视频路径)，全部结束后放入 None
+    :param path_list: list[string], 视频路径列表
+    :param frame_queue: queue.Queue, 帧队列
+    :param stop_event: threading.Event, 消费者提前结束时设置，通知生产者退出
+    """
+
+    def put(item):
+        while not stop_event.is_set():
+            try:
+                frame_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    for path in path_list:
+        logger.info(f"处理视频中：{path}")
+        last_hash = None
+        try:
+            for ids, frames in read_video_frames(path):
+                for id, frame in zip(ids, frames):
+                    frame_hash = get_frame_hash(frame) if FRAME_DEDUP_THRESHOLD >= 0 else None
+                    if is_duplicate_frame(frame_hash, last_hash):
+                        frame = None
+                    else:
+                        last_hash = frame_hash
+                    if not put(("frame", path, id, frame)):
+                        return
+        except Exception as e:
+            logger.exception("处理视频报错：path=%s error=%s" % (path, repr(e)))
+            if not put(("error", path)):
+                return
+        if not put(("end", path)):
+            return
+    put(None)
+
+
+def process_videos(path_list):
+    """
+    批量处理多个视频，不同视频的帧会拼到同一个批次里送入模型，避免每个视频结尾凑不满一个批次时浪费算力。
+    和上一采样帧重复的帧不送入模型，直接复用上一帧的特征。视频在后台线程中解码，与模型计算同时进行
+    返回一个生成器，每当一个视频的所有帧都计算完成，就返回这个视频的数据
+    :param path_list: list[string], 视频路径列表
+    :return: (string, list[(int, <class 'numpy.nparray'>)]), (视频路径, [(当前是第几帧（被采集的才算）, 图片特征), ...])
+    """
+    results = {path: [] for path in path_list}
+    pending = []  # 等待送入模型的帧：[(视频路径, 帧编号, 帧像素数据), ...]，帧像素数据为 None 表示与上一帧重复
+    pending_frames = 0  # pending 中需要送入模型的帧数
+    last_feature = None  # 上一个送入模型的帧的特征，给重复帧复用
+    outstanding = {}  # 视频路径 -> 该视频还在 pending 中的帧数
+    finished = deque()  # 已经解码完成，但可能还有帧在 pending 中的视频，按解码顺序排列
+
+    def flush():
+        nonlocal pending_frames, last_feature
+        frames = [frame for _, _, frame in pending if frame is not None]
+        features = get_image_feature(frames) if frames else []
+        if features is None:
+            logger.warning("features is None in process_videos")
+            last_feature = None
+        else:
+            features = iter(features)
+            for path, id, frame in pending:
+                if frame is not None:
+                    last_feature = next(features)
+                if last_feature is not None:
+                    results[path].append((id, last_feature))
+        pending.clear()
+        pending_frames = 0
+        outstanding.clear()
+
+    def pop_finished():
+        # 按顺序返回已经解码完成、并且所有帧都已计算完毕的视频
+        while finished and not outstanding.get(finished[0]):
+            finished_path = finished.popleft()
+            yield finished_path, results.pop(finished_path)
+
+    frame_queue = queue.Queue(maxsize=2 * SCAN_PROCESS_BATCH_SIZE)
+    stop_event = threading.Event()
+    threading.Thread(target=decode_videos, args=(path_list, frame_queue, stop_event), daemon=True).start()
+    try:
+        while True:
+            item = frame_queue.get()
+            if item is None:
+                break
+            if item[0] == "frame":
+                _, path, id, frame = item
+                pending.append((path, id, frame))
+                outstanding[path] = outstanding.get(path, 0) + 1
+                if frame is not None:
+                    pending_frames += 1
+                    if pending_frames >= SCAN_PROCESS_BATCH_SIZE:
+                        flush()
+                        yield from pop_finished()
+            elif item[0] == "error":
+                # 丢弃出错视频的数据，让它在下次扫描时重新处理
+                path = item[1]
+                pending[:] = [pending_item for pending_item in pending if pending_item[0] != path]
+                pending_frames = sum(frame is not None for _, _, frame in pending)
+                outstanding.pop(path, None)
+                results[path] = []
+            else:
+                finished.append(item[1])
+                yield from pop_finished()
+        if pending:
+            flush()
+        yield from pop_finished()
+    finally:
+        stop_event.set()  # 调用方提前停止迭代时，通知解码线程退出
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+@torch.inference_mode()
+def encode_text(input_text):
+    """
+    计算文字特征并按文字缓存，相同的搜索词和标签不会重复经过模型计算。
+    出错时直接抛出异常，失败（如临时显存不足）的结果不会被缓存
+    :param input_text: string, 被处理的字符串
+    :return: <class 'numpy.nparray'>,  文字特征（缓存共享的只读数组，需要修改时请先复制）
+    """
+    text = processor(text=input_text, return_tensors="pt", padding=True)["input_ids"].to(DEVICE)
+    feature = model.get_text_features(text).float()
+    normalize_feature = F.normalize(feature, p=2, dim=1)  # 归一化，方便后续计算余弦相似度
+    feature = normalize_feature.cpu().numpy()
+    feature.setflags(write=False)  # 缓存的结果会被多个调用方共享，禁止原地修改
+    return feature
 
 
 def process_text(input_text):
     """
-    预处理文字，返回文字特征
+    预处理文字，返回文字特征。成功的结果按文字缓存，见 encode_text
     :param input_text: string, 被处理的字符串
-    :return: <class 'numpy.nparray'>,  文字特征
+    :return: <class 'numpy.nparray'>,  文字特征（缓存共享的只读数组，需要修改时请先复制），出错时返回 None
     """
-    feature = None
     if not input_text:
         return None
     
@@ -295,16 +589,42 @@ def process_text(input_text):
         return None
     
     try:
-        text = processor(text=input_text, return_tensors="pt", padding=True)["input_ids"].to(DEVICE)
-        feature = model.get_text_features(text)
-        normalize_feature = feature / torch.norm(feature, dim=1, keepdim=True)  # 归一化，方便后续计算余弦相似度
-        feature = normalize_feature.detach().cpu().numpy()
+        return encode_text(input_text)
     except Exception as e:
         logger.exception("处理文字报错：text=%s error=%s" % (input_text, repr(e)))
         traceback.print_stack()
-        if feature is not None:
-            print("feature.shape:", feature.shape)
-            print("feature:", feature)
+        return None
+
+
+@torch.inference_mode()
+def process_texts(text_list):
+    """
+    批量预处理文字，一次前向计算返回所有文字的特征
+    :param text_list: list[string], 被处理的字符串列表
+    :return: <class 'numpy.nparray'>, 文字特征，shape=(len(text_list), m)，出错返回 None
+    """
+    feature = None
+    if not text_list:
+        return None
+
+    # 检查模型是否已加载
+    if model is None or processor is None:
+        logger.error("模型未加载，无法处理文字")
+        return None
+
+    try:
+        # 批量处理时需要 padding，同时传入 attention_mask，避免补齐的token影响特征
+        inputs = processor(text=list(text_list), return_tensors="pt", padding=True)
+        feature = model.get_text_features(
+            input_ids=inputs["input_ids"].to(DEVICE),
+            attention_mask=inputs["attention_mask"].to(DEVICE),
+        ).float()
+        normalize_feature = F.normalize(feature, p=2, dim=1)  # 归一化，方便后续计算余弦相似度
+        feature = normalize_feature.cpu().numpy()
+    except Exception as e:
+        logger.exception("批量处理文字报错：count=%d error=%s" % (len(text_list), repr(e)))
+        traceback.print_stack()
+        feature = None
     return feature
 
 
@@ -335,14 +655,15 @@ def match_batch(
     :param negative_threshold: int/float, 反向提示分数阈值，低于此分数才显示
     :return: <class 'numpy.nparray'>, 提示词和每个图片余弦相似度列表，shape=(n, )，如果小于正向提示分数阈值或大于反向提示分数阈值则会置0
     """
+    prompt_features = [feature for feature in (positive_feature, negative_feature) if feature is not None]
+    if prompt_features:  # 正向和反向提示词合并成一次矩阵乘法，只需要遍历一次 image_features
+        prompt_scores = image_features @ np.vstack(prompt_features).T
     if positive_feature is None:  # 没有正向feature就把分数全部设成1
         positive_scores = np.ones(len(image_features))
     else:
-        positive_scores = image_features @ positive_feature.T
-    if negative_feature is not None:
-        negative_scores = image_features @ negative_feature.T
+        positive_scores = prompt_scores[:, 0]
     # 根据阈值进行过滤
-    scores = np.where(positive_scores < positive_threshold / 100, 0, positive_scores)
+    mask = positive_scores < positive_threshold / 100
     if negative_feature is not None:
-        scores = np.where(negative_scores > negative_threshold / 100, 0, scores)
-    return scores.squeeze(-1)
+        mask |= prompt_scores[:, -1] > negative_threshold / 100
+    return np.where(mask, 0, positive_scores)
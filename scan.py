@@ -16,7 +16,7 @@ from database import (
     add_image,
 )
 from models import create_tables, DatabaseSession
-from process_assets import process_images, process_video
+from process_assets import process_images, process_videos
 from search import clean_cache
 from utils import get_file_hash
 
@@ -175,6 +175,15 @@ class Scanner:
             del self.assets[path]
         self.total_images = get_image_count(session)
 
+    def handle_video_batch(self, session, video_batch_dict):
+        for path, frame_time_features in process_videos(list(video_batch_dict.keys())):
+            modify_time, checksum = video_batch_dict[path]
+            if frame_time_features:
+                add_video(session, path, modify_time, checksum, frame_time_features)
+            del self.assets[path]
+        self.total_video_frames = get_video_frame_count(session)
+        self.total_videos = get_video_count(session)
+
     def scan(self, auto=False):
         """
         扫描资源。如果存在assets.pickle，则直接读取并开始扫描。如果不存在，则先读取所有文件路径，并写入assets.pickle，然后开始扫描。
@@ -207,6 +216,7 @@ class Scanner:
             # 扫描文件
             self.scanning_files = len(self.assets)
             image_batch_dict = {}  # 批量处理文件的字典，用字典方便某个图片有问题的时候的处理
+            video_batch_dict = {}  # 批量处理视频的字典，多个视频的帧会合并成批次送入模型
             for path in self.assets.copy():
                 self.scanned_files += 1
                 if self.scanned_files % AUTO_SAVE_INTERVAL == 0:  # 每扫描 AUTO_SAVE_INTERVAL 个文件重新save一下
@@ -238,12 +248,16 @@ class Scanner:
                     if not_modified:
                         del self.assets[path]
                         continue
-                    add_video(session, path, modify_time, checksum, process_video(path))
-                    self.total_video_frames = get_video_frame_count(session)
-                    self.total_videos = get_video_count(session)
+                    video_batch_dict[path] = (modify_time, checksum)
+                    if len(video_batch_dict) == SCAN_PROCESS_BATCH_SIZE:
+                        self.handle_video_batch(session, video_batch_dict)
+                        video_batch_dict = {}
+                    continue
                 del self.assets[path]
             if len(image_batch_dict) != 0:  # 最后如果图片数量没达到SCAN_PROCESS_BATCH_SIZE，也进行一次处理
                 self.handle_image_batch(session, image_batch_dict)
+            if len(video_batch_dict) != 0:
+                self.handle_video_batch(session, video_batch_dict)
             # 最后重新统计一下数量
             self.total_images = get_image_count(session)
             self.total_videos = get_video_count(session)
@@ -1,13 +1,21 @@
 import logging
+import threading
 import time
 from functools import lru_cache
 
 import numpy as np
 
+try:  # 可选依赖，安装后不带筛选条件的图片搜索使用 FAISS 索引
+    import faiss
+except ImportError:
+    faiss = None
+
 from config import *
 from database import (
     get_image_id_path_features_filter_by_path_time,
     get_image_features_by_id,
+    get_image_paths_by_ids,
+    get_image_version,
     get_video_paths,
     get_frame_times_features_by_path,
     get_pexels_video_features,
@@ -17,11 +25,74 @@ from process_assets import match_batch, process_image, process_text
 
 logger = logging.getLogger(__name__)
 
+image_index = None  # 全部图片的 (图片表版本, id数组, FAISS索引)，图片表有增删时在下一次搜索时重建
+image_index_lock = threading.Lock()
+
+
+def get_image_index(session):
+    """
+    获取全部图片特征的 FAISS 内积索引。没有索引，或者图片表在索引建立后有增删时，从数据库重新构建
+    :param session: Session, 数据库session
+    :return: (id数组, faiss.IndexFlatIP)，没有图片时返回 None
+    """
+    global image_index
+    with image_index_lock:
+        version = get_image_version(session)
+        if image_index is None or image_index[0] != version:
+            image_index = None
+            ids, _, features = get_image_id_path_features_filter_by_path_time(session, "", None, None)
+            if len(ids) == 0:
+                return None
+            features = np.frombuffer(b"".join(features), dtype=np.float32).reshape(len(features), -1)
+            index = faiss.IndexFlatIP(features.shape[1])
+            index.add(features)
+            image_index = (version, np.asarray(ids), index)
+        return image_index[1:]
+
+
+def get_range_search_radius(threshold):
+    """
+    range_search 只返回分数严格大于半径的结果，而 match_batch 保留分数大于等于阈值的结果。
+    返回比 float32 分数中第一个不小于阈值的值略小的半径，使两者的筛选结果一致
+    :param threshold: float, 分数阈值
+    :return: <class 'numpy.float32'>, 半径
+    """
+    radius = np.float32(threshold)
+    if radius < threshold:
+        radius = np.nextafter(radius, np.float32(np.inf))
+    return np.nextafter(radius, np.float32(-np.inf))
+
+
+def search_image_by_index(positive_feature, negative_feature, positive_threshold, negative_threshold):
+    """
+    使用 FAISS 索引搜索图片，只返回正向分数超过阈值的图片，不需要每次从数据库读取全部特征。
+    阈值的含义与 match_batch 相同；图片路径在搜索时从数据库读取，已删除的图片不会返回
+    :return: (id列表, 路径列表, 分数列表)
+    """
+    with DatabaseSession() as session:
+        cached_index = get_image_index(session)
+        if cached_index is None:
+            return [], [], []
+        ids, index = cached_index
+        lims, scores, indexes = index.range_search(np.ascontiguousarray(positive_feature, dtype=np.float32),
+                                                   get_range_search_radius(positive_threshold / 100))
+        scores, indexes = scores[lims[0]:lims[1]], indexes[lims[0]:lims[1]]
+        if negative_feature is not None and len(indexes):
+            keep = (index.reconstruct_batch(indexes) @ negative_feature.T).squeeze(-1) <= negative_threshold / 100
+            scores, indexes = scores[keep], indexes[keep]
+        result_ids = ids[indexes].tolist()
+        paths = get_image_paths_by_ids(session, result_ids)
+    found = [i for i, id in enumerate(result_ids) if id in paths]
+    return [result_ids[i] for i in found], [paths[result_ids[i]] for i in found], scores[found]
+
 
 def clean_cache():
     """
     清空搜索缓存
     """
+    global image_index
+    with image_index_lock:
+        image_index = None
     search_image_by_text_path_time.cache_clear()
     search_image_by_image.cache_clear()
     search_video_by_image.cache_clear()
@@ -50,12 +121,15 @@ def search_image_by_feature(
     :return: list[dict], 搜索结果列表
     """
     t0 = time.time()
-    with DatabaseSession() as session:
-        ids, paths, features = get_image_id_path_features_filter_by_path_time(session, filter_path, start_time, end_time)
-    if len(ids) == 0:  # 没有素材，直接返回空
-        return []
-    features = np.frombuffer(b"".join(features), dtype=np.float32).reshape(len(features), -1)
-    scores = match_batch(positive_feature, negative_feature, features, positive_threshold, negative_threshold)
+    if faiss is not None and positive_feature is not None and not filter_path and not start_time and not end_time:
+        ids, paths, scores = search_image_by_index(positive_feature, negative_feature, positive_threshold, negative_threshold)
+    else:
+        with DatabaseSession() as session:
+            ids, paths, features = get_image_id_path_features_filter_by_path_time(session, filter_path, start_time, end_time)
+        if len(ids) == 0:  # 没有素材，直接返回空
+            return []
+        features = np.frombuffer(b"".join(features), dtype=np.float32).reshape(len(features), -1)
+        scores = match_batch(positive_feature, negative_feature, features, positive_threshold, negative_threshold)
     return_list = []
     for id, path, score in zip(ids, paths, scores):
         if not score:
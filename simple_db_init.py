@@ -28,6 +28,16 @@ def init_database():
         with sqlite3.connect(db_path) as conn:
             cursor = conn.cursor()
             
+            # 与 database_migration 相同的连接设置，journal_mode 需要在开始事务前设置
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.execute("PRAGMA temp_store=MEMORY")
+            cursor.execute("PRAGMA cache_size=-64000")
+            
+            # sqlite3 模块不会为 CREATE 语句自动开启事务，每条建表、建索引语句都会单独提交一次，
+            # 这里显式开启事务，所有语句最后只提交一次
+            cursor.execute("BEGIN")
+            
             # 创建 schema_version 表
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS schema_version (
@@ -100,19 +110,22 @@ def validate_database():
         with sqlite3.connect(db_path) as conn:
             cursor = conn.cursor()
             
-            # 检查 image 表
-            cursor.execute("PRAGMA table_info(image)")
-            image_columns = {column[1] for column in cursor.fetchall()}
+            # 一次查询取出 image 和 video 两个表的所有列名
+            cursor.execute("""
+                SELECT m.name, p.name FROM sqlite_master AS m, pragma_table_info(m.name) AS p
+                WHERE m.type = 'table' AND m.name IN ('image', 'video')
+            """)
+            image_columns, video_columns = set(), set()
+            for table, column in cursor.fetchall():
+                (image_columns if table == 'image' else video_columns).add(column)
             
+            # 检查 image 表
             required_image_columns = {
                 'id', 'path', 'original_name', 'modify_time', 
                 'checksum', 'features', 'tags'
             }
             
             # 检查 video 表
-            cursor.execute("PRAGMA table_info(video)")
-            video_columns = {column[1] for column in cursor.fetchall()}
-            
             required_video_columns = {
                 'id', 'path', 'original_name', 'frame_time', 
                 'modify_time', 'checksum', 'features', 'tags'
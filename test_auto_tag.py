@@ -4,7 +4,9 @@
 Test Auto Tagging Functionality
 """
 
+import functools
 import logging
+import os
 import numpy as np
 from auto_tag import AutoTagger
 
@@ -12,19 +14,33 @@ from auto_tag import AutoTagger
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# 相似度计算方式，默认与 AutoTagger 一致（auto：安装了 simsimd 则用 simsimd）
+# 回归测试时可以分别指定，例如 SIMILARITY_BACKEND=numpy python test_auto_tag.py
+SIMILARITY_BACKEND = os.getenv('SIMILARITY_BACKEND', 'auto')
+# 设为1时使用int8量化的向量计算相似度（需要安装 simsimd），用于和 float32 的结果对比
+USE_INT8 = os.getenv('USE_INT8', '0') == '1'
+
+# 固定随机种子，每次运行生成相同的测试特征，便于对比不同计算方式的结果
+RNG = np.random.default_rng(0)
+
+@functools.lru_cache(maxsize=1)
+def _get_tagger():
+    """所有测试共用一个 AutoTagger，标签向量只加载（或计算）一次"""
+    return AutoTagger(use_int8=USE_INT8, similarity_backend=SIMILARITY_BACKEND)
+
 def test_tag_vectors_loading():
     """测试标签向量加载"""
     print("🔍 测试标签向量加载...")
     
     try:
-        tagger = AutoTagger()
+        tagger = _get_tagger()
         
         # 检查标签向量是否正确加载
-        if tagger.tag_vectors is not None:
+        if tagger.tag_matrix is not None:
             print(f"✅ 标签向量加载成功")
-            print(f"   形状: {tagger.tag_vectors.shape}")
-            print(f"   类型: {tagger.tag_vectors.dtype}")
-            print(f"   范围: {tagger.tag_vectors.min():.4f} 到 {tagger.tag_vectors.max():.4f}")
+            print(f"   形状: {tagger.tag_matrix.shape}")
+            print(f"   类型: {tagger.tag_matrix.dtype}")
+            print(f"   范围: {tagger.tag_matrix.min():.4f} 到 {tagger.tag_matrix.max():.4f}")
             return True
         else:
             print("❌ 标签向量加载失败")
@@ -39,17 +55,22 @@ def test_similarity_computation():
     print("\n🔍 测试相似度计算...")
     
     try:
-        tagger = AutoTagger()
+        tagger = _get_tagger()
         
         # 创建一个测试特征
-        test_feature = np.random.randn(1, tagger.tag_vectors.shape[1]).astype(np.float32)
+        test_feature = RNG.standard_normal((1, tagger.tag_matrix.shape[1]), dtype=np.float32)
         
         # 计算相似度
         similarities = tagger.compute_similarity(test_feature)
         
+        # 特征、标签向量和相似度全程使用 float32，避免隐式提升为 float64
+        if similarities.dtype != np.float32:
+            print(f"❌ 相似度类型应为 float32，实际为 {similarities.dtype}")
+            return False
+        
         print(f"✅ 相似度计算成功")
         print(f"   相似度数量: {len(similarities)}")
-        print(f"   相似度范围: {min(similarities.values()):.4f} 到 {max(similarities.values()):.4f}")
+        print(f"   相似度范围: {similarities.min():.4f} 到 {similarities.max():.4f}")
         
         # 获取top标签
         top_tags = tagger.get_top_tags(similarities)
@@ -69,10 +90,10 @@ def test_image_processing():
     print("\n🔍 测试图片处理...")
     
     try:
-        tagger = AutoTagger()
+        tagger = _get_tagger()
         
         # 创建一个测试图片特征
-        test_feature = np.random.randn(1, tagger.tag_vectors.shape[1]).astype(np.float32)
+        test_feature = RNG.standard_normal((1, tagger.tag_matrix.shape[1]), dtype=np.float32)
         
         # 处理图片
         tags = tagger.process_image(1, "test_image.jpg", test_feature)
@@ -93,50 +114,32 @@ def test_video_processing():
     print("\n🔍 测试视频处理...")
     
     try:
-        tagger = AutoTagger()
+        tagger = _get_tagger()
         
-        # 创建测试视频特征（模拟多个帧）
+        # 创建测试视频特征（模拟多个帧）：前3帧接近第1个标签，后2帧接近第2个标签，加少量噪声
         num_frames = 5
-        test_features = []
-        for i in range(num_frames):
-            feature = np.random.randn(1, tagger.tag_vectors.shape[1]).astype(np.float32)
-            test_features.append(feature.tobytes())
-        
-        # 模拟数据库查询结果
-        frame_times = list(range(0, num_frames * 2, 2))
-        
-        # 测试视频处理逻辑
-        all_tags = []
-        for i, feature in enumerate(test_features):
-            try:
-                feature_array = np.frombuffer(feature, dtype=np.float32).reshape(1, -1)
-                similarities = tagger.compute_similarity(feature_array)
-                top_tags = tagger.get_top_tags(similarities)
-                
-                for tag, score in top_tags:
-                    from tag_vocabulary import ENGLISH_TO_CHINESE
-                    chinese_tag = ENGLISH_TO_CHINESE.get(tag, tag)
-                    all_tags.append(chinese_tag)
-                    
-            except Exception as e:
-                print(f"   处理帧 {i} 时出错: {e}")
-                continue
+        frame_labels = np.array([0, 0, 0, 1, 1])
+        noise = RNG.standard_normal((num_frames, tagger.tag_matrix.shape[1]), dtype=np.float32)
+        feature_matrix = tagger.tag_matrix[frame_labels] + 0.01 * noise
         
-        print(f"✅ 视频处理测试成功")
-        print(f"   处理帧数: {num_frames}")
-        print(f"   生成标签总数: {len(all_tags)}")
+        # 与处理数据库中的视频时相同：一次矩阵乘法计算所有帧的相似度，再由 _get_video_tags 统计视频标签
+        similarities = tagger.compute_similarity_batch(feature_matrix)
+        video_tags = tagger._get_video_tags("test_video.mp4", similarities)
         
-        # 统计标签频率
-        from collections import defaultdict
-        tag_counts = defaultdict(int)
-        for tag in all_tags:
-            tag_counts[tag] += 1
+        print(f"   处理帧数: {num_frames}")
+        print(f"   视频标签: {video_tags}")
         
-        print(f"   唯一标签数: {len(tag_counts)}")
-        if tag_counts:
-            top_tags = sorted(tag_counts.items(), key=lambda x: x[1], reverse=True)[:3]
-            print(f"   前3个标签: {top_tags}")
+        # 出现次数最多的标签排在最前；出现次数达到 video_min_frequency 的标签都应保留
+        expected_first = tagger.chinese_names[0]
+        expected_second = tagger.chinese_names[1]
+        if not video_tags or video_tags[0] != expected_first:
+            print(f"❌ 第一个视频标签应为 {expected_first}")
+            return False
+        if expected_second not in video_tags:
+            print(f"❌ 视频标签中应包含 {expected_second}")
+            return False
         
+        print(f"✅ 视频处理测试成功")
         return True
         
     except Exception as e:
@@ -148,7 +151,7 @@ def test_filename_generation():
     print("\n🔍 测试文件名生成...")
     
     try:
-        tagger = AutoTagger()
+        tagger = _get_tagger()
         
         # 测试文件名生成
         original_path = "/path/to/test_video.mp4"
@@ -1,7 +1,11 @@
 import hashlib
 import logging
+import os
 import platform
+import shutil
 import subprocess
+import threading
+import time
 
 import numpy as np
 from PIL import Image, ImageOps, ImageDraw
@@ -51,11 +55,15 @@ def get_file_hash(file_path):
     :param file_path: string, 文件路径
     :return: string, 十六进制哈希值，或 None（文件读取错误）
     """
+    # 继续使用 sha1：数据库中已有的 checksum 都是 sha1，换算法会导致所有文件被当成已修改而重新扫描。
+    # hashlib 基于 OpenSSL，支持的 CPU 上会使用 SHA 指令集加速
     _hash = hashlib.sha1()
+    buffer = bytearray(1048576)  # 复用同一个缓冲区读取，避免每次读取都分配新的 bytes
+    view = memoryview(buffer)
     try:
         with open(file_path, 'rb') as f:
-            while chunk := f.read(1048576):
-                _hash.update(chunk)
+            while size := f.readinto(buffer):
+                _hash.update(view[:size])
         return _hash.hexdigest()
     except Exception as e:
         logger.error(f"计算文件hash出错：{file_path} {repr(e)}")
@@ -147,3 +155,26 @@ def resize_image_with_aspect_ratio(image_path, target_size, convert_rgb=False):
     # 调整图像的大小
     resized_image = image.resize((new_width, new_height))
     return resized_image
+
+
+def reset_temp_dir(temp_path, subdirs):
+    """
+    清空临时目录并重新创建子目录。旧目录先整体移入回收目录，再在后台线程中删除，启动时不需要等待逐个删除大量缓存文件
+    回收目录只存放本程序移入的旧临时目录，后台只删除回收目录中的内容，不会误删临时目录旁边的其他文件
+    :param temp_path: string, 临时目录路径
+    :param subdirs: list[string], 需要创建的子目录
+    """
+    temp_path = os.path.normpath(temp_path)
+    trash_path = os.path.join(os.path.dirname(temp_path), ".materialsearch_trash")
+    try:
+        os.makedirs(trash_path, exist_ok=True)
+        os.rename(temp_path, os.path.join(trash_path, str(time.time_ns())))
+    except FileNotFoundError:
+        pass
+    except OSError as e:  # 改名失败（如目录被占用）时退回直接删除
+        logger.warning(f"临时目录改名失败，直接删除：{temp_path} {repr(e)}")
+        shutil.rmtree(temp_path, ignore_errors=True)
+    for subdir in subdirs:
+        os.makedirs(os.path.join(temp_path, subdir), exist_ok=True)
+    # 上次没删完的旧目录也在回收目录中，一起删除
+    threading.Thread(target=shutil.rmtree, args=(trash_path,), kwargs={"ignore_errors": True}, daemon=True).start()